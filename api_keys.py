@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import secrets
+import time
+from datetime import timezone
+from typing import NamedTuple
+from config import settings
+
+
+def generate_key():
+    return secrets.token_urlsafe(32)
+
+
+def hash_key(key: str):
+    # Keys are 256 random bits, so a fast hash is enough: there is nothing
+    # to brute-force, and bcrypt would cost the milliseconds this avoids.
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class ApiClient(NamedTuple):
+    token_id: int
+    org_id: int
+    expires_at: float | None
+
+
+class APIKeyIndex():
+    # Every active, unexpired key by digest, so a lookup never touches the
+    # database. Token writes in this worker clear it at once; other workers
+    # pick changes up within API_KEY_REFRESH_INTERVAL.
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self.version = 0
+        self.loaded_at = None
+        self.hits = 0
+        self.misses = 0
+        self._clients = {}
+        self._loading = None
+
+    def stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.refresh_interval
+
+    def load(self, rows, version: int):
+        if version != self.version:
+            # a token changed while the rows were being read
+            return
+        clients = {}
+        for token_id, digest, org_id, validity in rows:
+            expires_at = validity.replace(tzinfo=timezone.utc).timestamp() if validity is not None else None
+            clients[digest] = ApiClient(token_id, org_id, expires_at)
+        self._clients = clients
+        self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        # dropped outright: until the reload lands every key is refused,
+        # never accepted from the old set
+        self.version += 1
+        self.loaded_at = None
+        self._clients = {}
+
+    async def refresh(self, fetch_rows, attempts: int = 3):
+        # One reload at a time, shared by every request that finds the index
+        # stale. A load that raced a token write is discarded and retried; if
+        # writes keep winning the index stays empty and lookups fail closed.
+        for _ in range(attempts):
+            if not self.stale():
+                return
+            if self._loading is None:
+                self._loading = asyncio.ensure_future(self._reload(fetch_rows))
+            # shield: one caller going away must not cancel the others' load
+            await asyncio.shield(self._loading)
+
+    async def _reload(self, fetch_rows):
+        try:
+            version = self.version
+            self.load(await fetch_rows(), version)
+        finally:
+            self._loading = None
+
+    def _find(self, key: str):
+        # the dict lookup compares digests, not keys: timing can reveal at
+        # most a prefix of a SHA-256, which says nothing about any key
+        client = self._clients.get(hash_key(key))
+        if client is None or (client.expires_at is not None and client.expires_at <= time.time()):
+            return None
+        return client
+
+    def lookup(self, key: str):
+        client = self._find(key)
+        if client is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return client
+
+    def contains(self, key: str):
+        return self._find(key) is not None
+
+    def stats(self):
+        return {"keys": len(self._clients), "version": self.version, "hits": self.hits, "misses": self.misses}
+
+
+api_key_index = APIKeyIndex(settings.api_key_refresh_interval)
@@ -0,0 +1,171 @@
+import os
+import re
+import stat
+import anyio
+from mimetypes import guess_type
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from config import settings
+
+# name.<8+ hex digits>.ext, e.g. chair.3f2a9c1b.webp -- the content hash in
+# the name means the bytes behind a URL never change
+FINGERPRINT_RE = re.compile(r"\.[0-9a-f]{8,}\.[^./]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# pre-built variants looked up next to the original, best first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def accepted_encodings(header: str):
+    accepted = set()
+    for part in header.split(","):
+        coding, *params = part.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    if "*" in accepted:
+        accepted.update(encoding for encoding, _ in ENCODINGS)
+    return accepted
+
+
+def parse_range(header: str, size: int):
+    # Only a single byte range is honoured; anything else falls back to the
+    # full file (allowed by RFC 9110). Returns (start, end) inclusive, or
+    # False when the range cannot be satisfied.
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class AssetResponse(FileResponse):
+    chunk_size = 256 * 1024
+
+    def __init__(self, path, offset: int = 0, count: int | None = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.offset = offset
+        self.count = count
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        count = self.count if self.count is not None else self.stat_result.st_size - self.offset
+        if self.send_header_only or count == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in scope.get("extensions", {}):
+            # the server hands the descriptor to sendfile(2); no bytes pass through Python
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.offset,
+                    "count": count,
+                    "more_body": False,
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(self.offset)
+                remaining = count
+                while remaining:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                if remaining:
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+class AssetFiles(StaticFiles):
+    # StaticFiles plus pre-compressed variants, long-lived caching for
+    # fingerprinted names and single byte-range requests.
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        full_path = os.fspath(full_path)
+        media_type = guess_type(full_path)[0] or "application/octet-stream"
+        name = os.path.basename(full_path)
+        headers = {
+            "accept-ranges": "bytes",
+            "cache-control": IMMUTABLE if FINGERPRINT_RE.search(name) else f"public, max-age={settings.static_max_age}",
+        }
+
+        range_header = request_headers.get("range")
+        variant = None
+        if range_header is None:
+            variant = self.lookup_variant(full_path, request_headers.get("accept-encoding", ""))
+        if variant is not None or self.has_variants(full_path):
+            headers["vary"] = "Accept-Encoding"
+        if variant is not None:
+            encoding, full_path, stat_result = variant
+            headers["content-encoding"] = encoding
+
+        response = AssetResponse(
+            full_path, status_code=status_code, headers=headers, media_type=media_type,
+            stat_result=stat_result, method=scope["method"],
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        if range_header is None or not self.range_applies(request_headers, response.headers):
+            return response
+
+        size = stat_result.st_size
+        byte_range = parse_range(range_header, size)
+        if byte_range is None:
+            return response
+        if byte_range is False:
+            return Response(status_code=416, headers={"content-range": f"bytes */{size}", **headers})
+        start, end = byte_range
+        response = AssetResponse(
+            full_path, offset=start, count=end - start + 1, status_code=206, headers=headers,
+            media_type=media_type, stat_result=stat_result, method=scope["method"],
+        )
+        response.headers["content-length"] = str(end - start + 1)
+        response.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        return response
+
+    def lookup_variant(self, full_path: str, accept_encoding: str):
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            try:
+                variant_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            if stat.S_ISREG(variant_stat.st_mode):
+                return encoding, full_path + suffix, variant_stat
+        return None
+
+    def has_variants(self, full_path: str):
+        return any(os.path.isfile(full_path + suffix) for _, suffix in ENCODINGS)
+
+    def range_applies(self, request_headers, response_headers):
+        # If-Range: only send the partial body when the client still holds
+        # the same representation, otherwise the whole file
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        return if_range in (response_headers["etag"], response_headers["last-modified"])
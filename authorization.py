@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import OrderedDict
+from config import settings
+
+
+class RoleCache():
+    # user id -> {org_id: frozenset of role names}. Role writes bump the
+    # version, which retires every entry at once; the TTL bounds how long
+    # another worker's write can go unnoticed.
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != self.version or entry[1] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, user_id: int, version: int, rows):
+        roles = {}
+        for org_id, role in rows:
+            roles.setdefault(org_id, set()).add(role)
+        roles = {org_id: frozenset(names) for org_id, names in roles.items()}
+        with self._lock:
+            # a write that landed while the rows were loading already bumped
+            # the version, so this entry is born stale rather than wrong
+            self._entries[user_id] = (version, time.monotonic() + self.ttl, roles)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return roles
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries), "maxsize": self.maxsize, "version": self.version,
+            "hits": self.hits, "misses": self.misses,
+        }
+
+
+def has_role(roles: dict, org_id: int, role: str):
+    return role in roles.get(org_id, ())
+
+
+role_cache = RoleCache(settings.role_cache_size, settings.role_cache_ttl)
@@ -0,0 +1,69 @@
+# Compares the response encoding paths for /products/ and /orders/ pages.
+# Run from the project root:  python -m benchmarks.serialization
+import json
+import timeit
+from datetime import datetime
+from types import SimpleNamespace
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+from pagination import Page
+from schemas import order_schemas, product_schemas
+from serialization import dump_json, type_adapter
+
+ROWS = 500
+ROUNDS = 50
+
+
+def fake_products():
+    return [
+        SimpleNamespace(
+            id=i, prod_name=f"product {i}", prod_og_price=199.0, prod_new_price=149.0,
+            prod_desc="A fairly ordinary product description " * 4,
+            prod_image=[f"/static/images/{i}-{n}.jpg" for n in range(4)],
+            prod_thumb_img=[f"/static/thumbs/{i}-{n}.jpg" for n in range(4)],
+        )
+        for i in range(ROWS)
+    ]
+
+
+def fake_orders():
+    return [
+        SimpleNamespace(id=i, prod_id=i % 50, ord_date=datetime(2024, 1, 1, 12, 0), org_id=i % 7, ord_price=149.0, user_id=i % 90)
+        for i in range(ROWS)
+    ]
+
+
+def stdlib_path(tp, data):
+    # previous default: python objects walked by jsonable_encoder, then JSONResponse(json.dumps)
+    adapter = type_adapter(tp)
+    value = adapter.validate_python(data, from_attributes=True)
+    content = jsonable_encoder(adapter.dump_python(value, mode="json"))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def orjson_path(tp, data):
+    # ORJSONResponse as default_response_class, still going through python objects
+    adapter = type_adapter(tp)
+    value = adapter.validate_python(data, from_attributes=True)
+    return orjson.dumps(adapter.dump_python(value, mode="json"))
+
+
+def main():
+    for name, tp, rows in [
+        ("/products/", Page[product_schemas.ProductRead], fake_products()),
+        ("/orders/", Page[order_schemas.OrderRead], fake_orders()),
+    ]:
+        data = {"items": rows, "next_cursor": None}
+        assert json.loads(stdlib_path(tp, data)) == json.loads(dump_json(tp, data))
+        print(f"{name} ({ROWS} rows per page, best of 5 x {ROUNDS} pages)")
+        baseline = None
+        for label, func in [("jsonable_encoder + json", stdlib_path), ("orjson", orjson_path), ("dump_json", dump_json)]:
+            best = min(timeit.repeat(lambda: func(tp, data), number=ROUNDS, repeat=5)) / ROUNDS
+            baseline = baseline or best
+            print(f"  {label:<24} {best * 1000:8.2f} ms/page  {baseline / best:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import OrderedDict
+from config import settings
+
+
+class LocalCache():
+    # In-process LRU with per-entry TTL. Also the stand-in for the shared
+    # backend when no CACHE_URL is configured.
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    async def set(self, key: str, value, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    async def add(self, key: str, value, ttl: float):
+        # set only if absent; True when this call stored the value
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return False
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return True
+
+    async def delete(self, *keys: str):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    async def incr(self, key: str):
+        with self._lock:
+            value = self._entries.get(key, (float("inf"), 0))[1] + 1
+            self._entries[key] = (float("inf"), value)
+            return value
+
+
+class RedisCache():
+    # Shared between workers so an invalidation in one is seen by all.
+    def __init__(self, url: str):
+        try:
+            from redis import asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("CACHE_URL is set but the redis package is not installed")
+        self._redis = aioredis.from_url(url)
+
+    async def get(self, key: str):
+        return await self._redis.get(key)
+
+    async def set(self, key: str, value, ttl: float):
+        await self._redis.set(key, value, px=int(ttl * 1000))
+
+    async def add(self, key: str, value, ttl: float):
+        return bool(await self._redis.set(key, value, px=int(ttl * 1000), nx=True))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self._redis.delete(*keys)
+
+    async def incr(self, key: str):
+        return await self._redis.incr(key)
+
+
+def make_backend():
+    if settings.cache_url:
+        return RedisCache(settings.cache_url)
+    return LocalCache(settings.cache_max_entries)
+
+
+class ProductCache():
+    # Holds serialized response bytes for /products/ pages and
+    # /products/{prod_id}. Every key embeds a generation number that product
+    # writes bump, so one increment drops the whole catalog. The key is built
+    # before the DB read, so a write racing with a miss can only leave bytes
+    # behind under a generation nobody asks for any more.
+    GENERATION_KEY = "products:generation"
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def key(self, *parts):
+        generation = int(await self.backend.get(self.GENERATION_KEY) or 0)
+        return ":".join(["products", str(generation), *map(str, parts)])
+
+    async def get(self, key: str):
+        body = await self.backend.get(key)
+        if body is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return body
+
+    async def set(self, key: str, body: bytes):
+        await self.backend.set(key, body, self.ttl)
+
+    async def invalidate(self):
+        await self.backend.incr(self.GENERATION_KEY)
+
+    def stats(self):
+        return {"backend": type(self.backend).__name__, "hits": self.hits, "misses": self.misses}
+
+
+product_cache = ProductCache(make_backend(), settings.product_cache_ttl)
@@ -0,0 +1,149 @@
+import zlib
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from assets import accepted_encodings
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+def is_compressible(content_type: str):
+    content_type = content_type.split(";", 1)[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.endswith(("+json", "+xml"))
+
+
+def weaken_etag(etag: str):
+    # the compressed bytes differ from the identity ones, so the tag can no
+    # longer be a strong validator; the opaque part stays the same and still
+    # matches under the weak comparison If-None-Match uses
+    return etag if etag.startswith("W/") else "W/" + etag
+
+
+class GzipEncoder():
+    def __init__(self, level: int):
+        # wbits=31 writes the gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes):
+        # sync flush so each streamed chunk reaches the client as it is produced
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b""):
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliEncoder():
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b""):
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+def make_encoder(encoding: str):
+    if encoding == "br":
+        return BrotliEncoder(settings.brotli_level)
+    return GzipEncoder(settings.gzip_level)
+
+
+def choose_encoding(accept_encoding: str):
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware():
+    def __init__(self, app, skip_prefixes: tuple[str, ...] = ("/static",)):
+        self.app = app
+        self.skip_prefixes = skip_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.skip_prefixes):
+            # files under /static are images or ship their own .br/.gz variants
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start_message = None
+        encoder = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, encoder, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if message["status"] == 304:
+                    # left untouched: it repeats the validator of the 200
+                    passthrough = True
+                    await send(message)
+                    return
+                if not is_compressible(headers.get("content-type", "")):
+                    passthrough = True
+                    await send(message)
+                    return
+                MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                if (
+                    encoding is None
+                    or "content-encoding" in headers
+                    or "content-range" in headers
+                    or message["status"] in (204, 206)
+                ):
+                    passthrough = True
+                    await send(message)
+                    return
+                # held back until the first body chunk decides the headers
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = MutableHeaders(scope=start_message)
+                if not more_body and len(body) < settings.compression_minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                headers["content-encoding"] = encoding
+                if "etag" in headers:
+                    headers["etag"] = weaken_etag(headers["etag"])
+                encoder = make_encoder(encoding)
+                if more_body:
+                    del headers["content-length"]
+                    body = encoder.compress(body)
+                else:
+                    if len(body) >= settings.compression_offload_size:
+                        # a multi-megabyte page would otherwise stall every
+                        # other request on this worker while it compresses
+                        body = await anyio.to_thread.run_sync(encoder.finish, body)
+                    else:
+                        body = encoder.finish(body)
+                    headers["content-length"] = str(len(body))
+                await send(start_message)
+                start_message = None
+            elif more_body:
+                body = encoder.compress(body)
+            else:
+                body = encoder.finish(body)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,11 @@
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def run_crud(db, func, *args):
+    # crud functions are written once against a sync Session. On an AsyncSession
+    # they run through run_sync, which drives the async driver from a greenlet,
+    # so no thread is held while the query is in flight.
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(func, *args)
+    return await run_in_threadpool(func, db, *args)
@@ -1,34 +1,52 @@
+from sqlalchemy import delete, insert, update
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 import models
+from crud import bulk
+from pagination import keyset_page
 
 from schemas import address_schemas
 
 
-def get_addresses(db: Session):
-    return db.query(models.Address).all()
+def get_addresses(db: Session, after: int | None = None, limit: int = 50):
+    return keyset_page(db.query(models.Address), models.Address.id, after, limit)
+
+def get_addresses_by_ids(db: Session, ids: list[int]):
+    return bulk.get_many(db, models.Address, ids)
 
 def get_address_by_id(db: Session, address_id: int):
     return db.query(models.Address).filter(models.Address.id == address_id).first()
 
 def create_address(db: Session, address_data: address_schemas.AddressCreate):
-    new_address = models.Address(**address_data.model_dump())
-    db.add(new_address)
+    new_address = db.scalar(insert(models.Address).values(**address_data.model_dump()).returning(models.Address))
     db.commit()
-    db.refresh(new_address)
     return new_address
 
 
 def update_address(db: Session, address_id: int, address_data: address_schemas.AddressUpdate):
-    db_address = db.query(models.Address).filter(models.Address.id == address_id).first()
+    db_address = db.scalar(
+        update(models.Address)
+        .where(models.Address.id == address_id)
+        .values(**address_data.model_dump(exclude_unset=True))
+        .returning(models.Address)
+    )
     if db_address is None:
         raise HTTPException(status_code=404, detail="Address not found")
-    for attr, value in address_data.model_dump(exclude_unset=True).items():
-        setattr(db_address, attr, value)
     db.commit()
     return db_address, {"message": "Address updated successfully"} 
 
 def delete_address(db: Session, address_id: int):
-    db.query(models.Address).filter(models.Address.id == address_id).delete()
+    result = db.execute(delete(models.Address).where(models.Address.id == address_id))
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Address not found")
     db.commit()
     return {"message": "Address deleted successfully"}
+
+def bulk_create_addresses(db: Session, items: list):
+    return bulk.bulk_create(db, models.Address, items)
+
+def bulk_update_addresses(db: Session, items: list):
+    return bulk.bulk_update(db, models.Address, items)
+
+def bulk_delete_addresses(db: Session, ids: list[int]):
+    return bulk.bulk_delete(db, models.Address, ids)
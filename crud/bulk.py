@@ -0,0 +1,74 @@
+from sqlalchemy import Integer, any_, bindparam, delete, insert, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from config import settings
+from crud import version_crud
+
+
+def check_batch(items):
+    if not items:
+        raise HTTPException(status_code=422, detail="Batch is empty")
+    if len(items) > settings.bulk_max_items:
+        raise HTTPException(status_code=422, detail=f"Batch is limited to {settings.bulk_max_items} items")
+
+
+def parse_ids(raw: str):
+    try:
+        ids = [int(part) for part in raw.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma separated list of integers")
+    if not ids:
+        raise HTTPException(status_code=422, detail="No ids given")
+    if len(ids) > settings.batch_max_ids:
+        raise HTTPException(status_code=422, detail=f"Batch lookups are limited to {settings.batch_max_ids} ids")
+    return list(dict.fromkeys(ids))
+
+
+def id_in(model, ids: list[int]):
+    # the ids travel as one array parameter, so every batch size shares a
+    # single statement (and plan) instead of IN (:id_1, ..., :id_n), and a
+    # full batch stays clear of asyncpg's 32767 bind parameter limit
+    return model.id == any_(bindparam("ids", list(ids), type_=ARRAY(Integer)))
+
+
+def get_many(db: Session, model, ids: list[int]):
+    rows = db.scalars(select(model).where(id_in(model, ids))).all()
+    by_id = {row.id: row for row in rows}
+    found = [by_id[id] for id in ids if id in by_id]
+    missing = [id for id in ids if id not in by_id]
+    return found, missing
+
+
+def bulk_create(db: Session, model, items):
+    check_batch(items)
+    # insertmanyvalues sends the rows as multi-row INSERT ... RETURNING
+    # statements; sort_by_parameter_order keeps results in request order
+    created = db.scalars(
+        insert(model).returning(model, sort_by_parameter_order=True),
+        [item.model_dump() for item in items],
+    ).all()
+    version_crud.bump_version(db, model.__tablename__)
+    db.commit()
+    return created
+
+
+def bulk_update(db: Session, model, items):
+    check_batch(items)
+    ids = [item.id for item in items]
+    existing = set(db.scalars(select(model.id).where(id_in(model, ids))))
+    rows = [item.model_dump(exclude_unset=True) for item in items if item.id in existing]
+    if rows:
+        # ORM bulk UPDATE by primary key, executed as a single executemany
+        db.execute(update(model), rows)
+    version_crud.bump_version(db, model.__tablename__)
+    db.commit()
+    return [{"id": item.id, "status": "updated" if item.id in existing else "not_found"} for item in items]
+
+
+def bulk_delete(db: Session, model, ids):
+    check_batch(ids)
+    deleted = set(db.scalars(delete(model).where(id_in(model, ids)).returning(model.id)))
+    version_crud.bump_version(db, model.__tablename__)
+    db.commit()
+    return [{"id": item_id, "status": "deleted" if item_id in deleted else "not_found"} for item_id in ids]
@@ -1,33 +1,127 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import Integer, any_, bindparam, delete, insert, select, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session, joinedload, selectinload
 from fastapi import HTTPException
+from datetime import datetime
 import models
+from crud import bulk
+from pagination import keyset_page
 
 from schemas import order_schemas
 
 
-def get_orders(db: Session):
-    return db.query(models.Order).all()
+# expand= names accepted by the order read endpoints
+EXPANSIONS = {
+    "product": models.Order.product_relation,
+    "user": models.Order.user_relation,
+    "organization": models.Order.organization_relation,
+    "items": models.Order.item_relation,
+}
 
-def get_order_by_id(db: Session, ord_id: int):
-    return db.query(models.Order).filter(models.Order.id == ord_id).first()
+def parse_expand(expand: str | None):
+    names = [name.strip() for name in (expand or "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in EXPANSIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown expand value(s): {', '.join(unknown)}; expected any of {', '.join(EXPANSIONS)}",
+        )
+    return list(dict.fromkeys(names))
+
+def expanded(order: models.Order, expand: list[str]):
+    # only the requested relations are touched, so nothing lazy loads
+    data = {column.key: getattr(order, column.key) for column in models.Order.__table__.columns}
+    for name in expand:
+        data[name] = getattr(order, EXPANSIONS[name].key)
+    return data
+
+def get_orders(db: Session, after: int | None = None, limit: int = 50, expand: list[str] = ()):
+    # one extra SELECT ... WHERE id IN (...) per relation, however long the page
+    query = db.query(models.Order).options(*(selectinload(EXPANSIONS[name]) for name in expand))
+    rows, next_cursor = keyset_page(query, models.Order.id, after, limit)
+    return [expanded(order, expand) for order in rows], next_cursor
+
+def get_orders_by_ids(db: Session, ids: list[int]):
+    return bulk.get_many(db, models.Order, ids)
+
+def get_order_by_id(db: Session, ord_id: int, expand: list[str] = ()):
+    # many-to-one joins add no rows, so those come with the order in one
+    # query; line items are a collection and get their own SELECT
+    order = (
+        db.query(models.Order)
+        .options(*(
+            (selectinload if EXPANSIONS[name].property.uselist else joinedload)(EXPANSIONS[name]) for name in expand
+        ))
+        .filter(models.Order.id == ord_id)
+        .first()
+    )
+    if order is None:
+        return None
+    return expanded(order, expand)
 
 def create_order(db: Session, ord_data: order_schemas.OrderCreate):
-    new_order = models.Order(**ord_data.model_dump())
-    db.add(new_order)
+    new_order = db.scalar(insert(models.Order).values(**ord_data.model_dump()).returning(models.Order))
     db.commit()
-    db.refresh(new_order)
     return new_order
 
+def checkout(db: Session, checkout_data: order_schemas.CheckoutCreate):
+    bulk.check_batch(checkout_data.items)
+    prod_ids = list({item.prod_id for item in checkout_data.items})
+    # one lookup for every product in the cart; prices come from the
+    # catalog, never from the client
+    prices = dict(db.execute(
+        select(models.Product.id, models.Product.prod_new_price)
+        .where(models.Product.id == any_(bindparam("ids", prod_ids, type_=ARRAY(Integer))))
+    ).all())
+    unknown = sorted(prod_id for prod_id in prod_ids if prices.get(prod_id) is None)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown or unpriced products: {unknown}")
+
+    new_order = db.scalar(
+        insert(models.Order)
+        .values(
+            ord_date=checkout_data.ord_date or datetime.utcnow(),
+            org_id=checkout_data.org_id,
+            user_id=checkout_data.user_id,
+            ord_price=sum(prices[item.prod_id] * item.quantity for item in checkout_data.items),
+            total_orders=sum(item.quantity for item in checkout_data.items),
+        )
+        .returning(models.Order)
+    )
+    items = db.scalars(
+        insert(models.OrderItem).returning(models.OrderItem, sort_by_parameter_order=True),
+        [
+            {"ord_id": new_order.id, "prod_id": item.prod_id, "quantity": item.quantity, "unit_price": prices[item.prod_id]}
+            for item in checkout_data.items
+        ],
+    ).all()
+    db.commit()
+    return {**expanded(new_order, []), "items": items}
+
 def update_order(db: Session, ord_id: int, ord_data: order_schemas.OrderUpdate):
-    db_order = db.query(models.Order).filter(models.Order.id == ord_id).first()
+    db_order = db.scalar(
+        update(models.Order)
+        .where(models.Order.id == ord_id)
+        .values(**ord_data.model_dump(exclude_unset=True))
+        .returning(models.Order)
+    )
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
-    for attr, value in ord_data.model_dump(exclude_unset=True).items():
-        setattr(db_order, attr, value)
     db.commit()
     return db_order, {"message": "Order updated successfully"} 
 
 def delete_order(db: Session, ord_id: int):
-    db.query(models.Order).filter(models.Order.id == ord_id).delete()
+    result = db.execute(delete(models.Order).where(models.Order.id == ord_id))
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Order not found")
     db.commit()
     return {"message": "Order deleted successfully"}
+
+def bulk_create_orders(db: Session, items: list):
+    return bulk.bulk_create(db, models.Order, items)
+
+def bulk_update_orders(db: Session, items: list):
+    return bulk.bulk_update(db, models.Order, items)
+
+def bulk_delete_orders(db: Session, ids: list[int]):
+    return bulk.bulk_delete(db, models.Order, ids)
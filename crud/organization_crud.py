@@ -1,33 +1,55 @@
+from sqlalchemy import delete, insert, update
 from sqlalchemy.orm import Session
 from schemas import organization_schemas
 from fastapi import HTTPException
 import models
+from crud import bulk
+from crud import version_crud
+from pagination import keyset_page
 
 
-def get_organization(db: Session):
-    return db.query(models.Organization).all()
+def get_organization(db: Session, after: int | None = None, limit: int = 50):
+    return keyset_page(db.query(models.Organization), models.Organization.id, after, limit)
+
+def get_organizations_by_ids(db: Session, ids: list[int]):
+    return bulk.get_many(db, models.Organization, ids)
 
 def get_organization_by_id(db: Session, org_id: int):
     return db.query(models.Organization).filter(models.Organization.id == org_id).first()
 
-def create_organization(db: Session, org_data: organization_schemas.OrgCreate):
-    new_org = models.Organization(**org_data.model_dump())
-    db.add(new_org)
+def create_organization(db: Session, org_data: organization_schemas.OrgCreate, admin_id: int | None = None):
+    new_org = db.scalar(insert(models.Organization).values(**org_data.model_dump()).returning(models.Organization))
+    version_crud.bump_version(db, "organization")
+    if admin_id is not None:
+        db.execute(insert(models.Role).values(org_id=new_org.id, user_id=admin_id, role="admin"))
+        version_crud.bump_version(db, "role")
     db.commit()
-    db.refresh(new_org)
     return new_org
 
 
 def update_organization(db: Session, org_id: int, org_data: organization_schemas.OrgUpdate):
-    db_org = db.query(models.Organization).filter(models.Organization.id == org_id).first()
+    db_org = db.scalar(
+        update(models.Organization)
+        .where(models.Organization.id == org_id)
+        .values(**org_data.model_dump(exclude_unset=True))
+        .returning(models.Organization)
+    )
     if db_org is None:
         raise HTTPException(status_code=404, detail="Organization not found")
-    for attr, value in org_data.model_dump(exclude_unset=True).items():
-        setattr(db_org, attr, value)
+    version_crud.bump_version(db, "organization")
     db.commit()
     return {"message": "Organization Updated successfully"}
 
 def delete_organization(db: Session, org_id: int):
-    db.query(models.Organization).filter(models.Organization.id == org_id).delete()
+    # roles and API keys belong to the organization and go with it; orders
+    # are kept but detached
+    db.execute(update(models.Order).where(models.Order.org_id == org_id).values(org_id=None))
+    db.execute(delete(models.Role).where(models.Role.org_id == org_id))
+    db.execute(delete(models.Token).where(models.Token.org_id == org_id))
+    result = db.execute(delete(models.Organization).where(models.Organization.id == org_id))
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Organization not found")
+    version_crud.bump_version(db, "organization")
+    version_crud.bump_version(db, "role")
     db.commit()
     return {"message": "Organization deleted successfully"}
\ No newline at end of file
@@ -1,31 +1,79 @@
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.orm import Session
 from schemas import product_schemas
 from fastapi import HTTPException
 import models
+from crud import version_crud
+from crud import bulk
+from pagination import keyset_page
 
-def get_products(db: Session):
-    return db.query(models.Product).all()
+def get_products(db: Session, after: int | None = None, limit: int = 50):
+    return keyset_page(db.query(models.Product), models.Product.id, after, limit)
+
+def get_products_by_ids(db: Session, ids: list[int]):
+    return bulk.get_many(db, models.Product, ids)
 
 def get_product_by_id(db: Session, prod_id: int):
     return db.query(models.Product).filter(models.Product.id == prod_id).first()
 
 def create_product(db: Session, product_data: product_schemas.ProductCreate):
-    new_product = models.Product(**product_data.model_dump())
-    db.add(new_product)
+    new_product = db.scalar(insert(models.Product).values(**product_data.model_dump()).returning(models.Product))
+    version_crud.bump_version(db, "product")
     db.commit()
-    db.refresh(new_product)
     return new_product
 
 def update_product(db: Session, prod_id: int, product_data: product_schemas.ProductUpdate):
-    db_product = db.query(models.Product).filter(models.Product.id == prod_id).first()
+    db_product = db.scalar(
+        update(models.Product)
+        .where(models.Product.id == prod_id)
+        .values(**product_data.model_dump(exclude_unset=True))
+        .returning(models.Product)
+    )
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    for attr, value in product_data.model_dump(exclude_unset=True).items():
-        setattr(db_product, attr, value)
+    version_crud.bump_version(db, "product")
     db.commit()
     return db_product
 
+def set_thumbnails(db: Session, prod_id: int, images: list[str], thumbs: list[str | None]):
+    # skipped when prod_image changed while the thumbnails were rendering;
+    # the newer write schedules its own
+    row = db.execute(
+        select(models.Product.prod_thumb_img)
+        .where(models.Product.id == prod_id, models.Product.prod_image == images)
+        .with_for_update()
+    ).first()
+    if row is None:
+        db.rollback()
+        return False
+    # one thumbnail per image: where rendering failed keep the thumbnail
+    # already stored at that position, else fall back to the image itself
+    current = row.prod_thumb_img or []
+    merged = [
+        thumb or (current[i] if i < len(current) and current[i] else image)
+        for i, (image, thumb) in enumerate(zip(images, thumbs))
+    ]
+    if merged == current:
+        db.rollback()
+        return False
+    db.execute(update(models.Product).where(models.Product.id == prod_id).values(prod_thumb_img=merged))
+    version_crud.bump_version(db, "product")
+    db.commit()
+    return True
+
 def delete_product(db: Session, prod_id: int):
-    db.query(models.Product).filter(models.Product.id == prod_id).delete()
+    result = db.execute(delete(models.Product).where(models.Product.id == prod_id))
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Product not found")
+    version_crud.bump_version(db, "product")
     db.commit()
-    return {"message": "Product deleted successfully"}
\ No newline at end of file
+    return {"message": "Product deleted successfully"}
+
+def bulk_create_products(db: Session, items: list):
+    return bulk.bulk_create(db, models.Product, items)
+
+def bulk_update_products(db: Session, items: list):
+    return bulk.bulk_update(db, models.Product, items)
+
+def bulk_delete_products(db: Session, ids: list[int]):
+    return bulk.bulk_delete(db, models.Product, ids)
@@ -1,34 +1,50 @@
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 import models
+from crud import bulk
+from crud import version_crud
+from pagination import keyset_page
 
 from schemas import role_schemas
 
 
-def get_roles(db: Session):
-    return db.query(models.Role).all()
+def get_roles(db: Session, after: int | None = None, limit: int = 50):
+    return keyset_page(db.query(models.Role), models.Role.id, after, limit)
+
+def get_roles_by_ids(db: Session, ids: list[int]):
+    return bulk.get_many(db, models.Role, ids)
 
 def get_role_by_id(db: Session, role_id: int):
     return db.query(models.Role).filter(models.Role.id == role_id).first()
 
+def get_user_roles(db: Session, user_id: int):
+    return db.execute(select(models.Role.org_id, models.Role.role).where(models.Role.user_id == user_id)).all()
+
 def create_role(db: Session, role_data: role_schemas.RoleCreate):
-    new_role = models.Role(**role_data.model_dump())
-    db.add(new_role)
+    new_role = db.scalar(insert(models.Role).values(**role_data.model_dump()).returning(models.Role))
+    version_crud.bump_version(db, "role")
     db.commit()
-    db.refresh(new_role)
     return new_role
 
 
 def update_role(db: Session, role_id: int, role_data: role_schemas.RoleUpdate):
-    db_role = db.query(models.Role).filter(models.Role.id == role_id).first()
+    db_role = db.scalar(
+        update(models.Role)
+        .where(models.Role.id == role_id)
+        .values(**role_data.model_dump(exclude_unset=True))
+        .returning(models.Role)
+    )
     if db_role is None:
         raise HTTPException(status_code=404, detail="Role not found")
-    for attr, value in role_data.model_dump(exclude_unset=True).items():
-        setattr(db_role, attr, value)
+    version_crud.bump_version(db, "role")
     db.commit()
     return db_role, {"message": "Role updated successfully"} 
 
 def delete_role(db: Session, role_id: int):
-    db.query(models.Role).filter(models.Role.id == role_id).delete()
+    result = db.execute(delete(models.Role).where(models.Role.id == role_id))
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Role not found")
+    version_crud.bump_version(db, "role")
     db.commit()
     return {"message": "Role deleted successfully"}
@@ -0,0 +1,42 @@
+from sqlalchemy import delete, insert, or_, select
+from sqlalchemy.orm import Session
+from fastapi import HTTPException
+from datetime import datetime, timezone
+import models
+from api_keys import generate_key, hash_key
+
+from schemas import token_schemas
+
+
+def get_active_tokens(db: Session):
+    return db.execute(
+        select(models.Token.id, models.Token.token_key, models.Token.org_id, models.Token.validity)
+        .where(models.Token.is_active.is_(True))
+        .where(or_(models.Token.validity.is_(None), models.Token.validity > datetime.utcnow()))
+    ).all()
+
+def get_tokens(db: Session, org_id: int):
+    return db.scalars(select(models.Token).where(models.Token.org_id == org_id).order_by(models.Token.id)).all()
+
+def create_token(db: Session, org_id: int, token_data: token_schemas.TokenCreate):
+    key = generate_key()
+    validity = token_data.validity
+    if validity is not None and validity.tzinfo is not None:
+        # stored as naive UTC like the other DateTime columns
+        validity = validity.astimezone(timezone.utc).replace(tzinfo=None)
+    new_token = db.scalar(
+        insert(models.Token)
+        .values(token_key=hash_key(key), validity=validity, org_id=org_id, is_active=True)
+        .returning(models.Token)
+    )
+    db.commit()
+    return token_schemas.TokenIssued(
+        id=new_token.id, org_id=new_token.org_id, validity=new_token.validity, is_active=new_token.is_active, key=key,
+    )
+
+def delete_token(db: Session, org_id: int, token_id: int):
+    result = db.execute(delete(models.Token).where(models.Token.id == token_id, models.Token.org_id == org_id))
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Token not found")
+    db.commit()
+    return {"message": "Token deleted successfully"}
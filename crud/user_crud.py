@@ -1,28 +1,53 @@
+from sqlalchemy import delete, insert, update
 from sqlalchemy.orm import Session
 from schemas import user_schemas
 import models
+from crud import bulk
+from crud import version_crud
+from pagination import keyset_page
 
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 
 def create_user(db: Session, user: user_schemas.UserCreate):
-    db_user = models.User( **user.model_dump())
-    db.add(db_user)
+    db_user = db.scalar(insert(models.User).values(**user.model_dump()).returning(models.User))
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 
-def get_users(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(models.User).offset(skip).limit(limit).all()
+def get_users(db: Session, after: int | None = None, limit: int = 10):
+    return keyset_page(db.query(models.User), models.User.id, after, limit)
 
 def get_user(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
+def get_users_by_ids(db: Session, ids: list[int]):
+    return bulk.get_many(db, models.User, ids)
+
+def get_user_by_id(db: Session, user_id: int):
+    return db.query(models.User).filter(models.User.id == user_id).first()
+
+def update_user(db: Session, user_id: int, user: user_schemas.UserUpdate):
+    values = {attr: value for attr, value in user.model_dump(exclude_unset=True).items() if value is not None}
+    db_user = db.scalar(update(models.User).where(models.User.id == user_id).values(**values).returning(models.User))
+    if db_user is None:
+        return None
+    db.commit()
+    return db_user
+
 
-#not added
 def delete_user(db: Session, user_id: int):
-    db.query(models.User).filter(models.User.id == user_id).delete()
+    # what the ORM delete used to do through the relationships: orders and
+    # addresses are kept but detached, role memberships go with the user
+    db.execute(update(models.Order).where(models.Order.user_id == user_id).values(user_id=None))
+    db.execute(update(models.Address).where(models.Address.user_id == user_id).values(user_id=None))
+    roles = db.execute(delete(models.Role).where(models.Role.user_id == user_id))
+    result = db.execute(delete(models.User).where(models.User.id == user_id))
+    if result.rowcount == 0:
+        db.rollback()
+        return None
+    if roles.rowcount:
+        version_crud.bump_version(db, "role")
     db.commit()
     return {"message": "User deleted successfully"}
@@ -0,0 +1,23 @@
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+import models
+
+# Tables whose read endpoints carry ETags. Each write bumps a single counter
+# row, so it is kept off the high-volume order and address tables.
+VERSIONED_TABLES = {"product", "organization", "role"}
+
+
+def bump_version(db: Session, table_name: str):
+    # runs inside the writer's transaction, so the counter moves exactly
+    # when the change becomes visible
+    if table_name not in VERSIONED_TABLES:
+        return
+    stmt = insert(models.TableVersion).values(table_name=table_name, version=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.TableVersion.table_name],
+        set_={"version": models.TableVersion.version + 1},
+    ))
+
+def get_version(db: Session, table_name: str):
+    return db.scalar(select(models.TableVersion.version).where(models.TableVersion.table_name == table_name)) or 0
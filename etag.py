@@ -0,0 +1,43 @@
+import hashlib
+from fastapi import Request, Response
+from cache import product_cache
+from crud import run_crud, version_crud
+
+
+def make_etag(*parts):
+    digest = hashlib.blake2b(":".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+async def table_etag(db, table_name: str, *params):
+    # The tag is derived from the table's change counter plus the query
+    # parameters, so checking it costs one primary-key lookup instead of the
+    # full query and serialization. Product versions ride on the catalog
+    # cache so product cache hits stay off the database.
+    if table_name == "product":
+        key = await product_cache.key("version")
+        version = await product_cache.backend.get(key)
+        if version is None:
+            version = await run_crud(db, version_crud.get_version, table_name)
+            await product_cache.set(key, version)
+    else:
+        version = await run_crud(db, version_crud.get_version, table_name)
+    return make_etag(table_name, int(version), *params)
+
+
+def etag_matches(request: Request, etag: str, wildcard: bool = True):
+    # "*" matches any existing representation. Detail reads check the tag
+    # before they know the row exists, so they pass wildcard=False and a
+    # missing id still gets its 404.
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return wildcard
+    # weak comparison, as RFC 9110 requires for If-None-Match; compressed
+    # responses carry the weak form of the same tag
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def not_modified(etag: str):
+    return Response(status_code=304, headers={"ETag": etag})
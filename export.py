@@ -0,0 +1,57 @@
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from config import settings
+from database import AsyncSessionLocal, SessionLocal
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "json": "application/json"}
+
+
+def _encode(schema, rows):
+    return [schema.model_validate(row).model_dump_json().encode() for row in rows]
+
+
+def _frame(fmt, chunk, first):
+    # ndjson: one object per line; json: a single array written piecewise
+    if fmt == "ndjson":
+        return b"\n".join(chunk) + b"\n"
+    return (b"" if first else b",") + b",".join(chunk)
+
+
+def _export_stmt(model):
+    # plain column rows skip the ORM identity map; yield_per turns on a
+    # server-side cursor so only one batch is held in memory at a time
+    stmt = select(*model.__table__.columns).order_by(model.id)
+    return stmt.execution_options(yield_per=settings.export_batch_size)
+
+
+def _iter_sync(model, schema, fmt):
+    if fmt == "json":
+        yield b"["
+    first = True
+    with SessionLocal() as db:
+        for rows in db.execute(_export_stmt(model)).partitions():
+            yield _frame(fmt, _encode(schema, rows), first)
+            first = False
+    if fmt == "json":
+        yield b"]"
+
+
+async def _iter_async(model, schema, fmt):
+    if fmt == "json":
+        yield b"["
+    first = True
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(_export_stmt(model))
+        async for rows in result.partitions():
+            yield _frame(fmt, _encode(schema, rows), first)
+            first = False
+    if fmt == "json":
+        yield b"]"
+
+
+def export_response(model, schema, fmt: str = "ndjson"):
+    if settings.db_async:
+        body = _iter_async(model, schema, fmt)
+    else:
+        body = _iter_sync(model, schema, fmt)
+    return StreamingResponse(body, media_type=MEDIA_TYPES[fmt])
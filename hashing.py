@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from config import settings
+
+pwd_context = CryptContext(schemes=['bcrypt'],deprecated='auto')
+
+
+class HashingPool():
+    # bcrypt releases the GIL while hashing, so a thread pool scales with cores
+    # without having to pickle the CryptContext into worker processes.
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hashing")
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many password operations in progress, try again shortly",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+        future = self._executor.submit(func, *args)
+        # released when the work itself ends, not when the caller stops
+        # waiting: a cancelled request leaves its hash running in the thread
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future):
+        # runs in the worker thread, or at once if the task never started
+        with self._lock:
+            self.pending -= 1
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": min(self.pending, self.workers),
+            "queue_depth": max(self.pending - self.workers, 0),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+hashing_pool = HashingPool(settings.hashing_workers, settings.hashing_max_pending)
+
+
+class Hasher():
+    @staticmethod
+    def verify_password(plain_password, hashed_password):
+        return pwd_context.verify(plain_password, hashed_password)
+
+    @staticmethod
+    def get_password_hash(password):
+        return pwd_context.hash(password)
+
+    @staticmethod
+    async def verify_password_async(plain_password, hashed_password):
+        return await hashing_pool.run(pwd_context.verify, plain_password, hashed_password)
+
+    @staticmethod
+    async def get_password_hash_async(password):
+        return await hashing_pool.run(pwd_context.hash, password)
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import json
+from starlette.datastructures import Headers
+from cache import LocalCache, RedisCache
+from config import settings
+from ratelimit import client_key
+
+
+# stored under the key while the first request runs, followed by its body's
+# fingerprint; completed entries start with the JSON meta line instead
+PENDING = b"pending:"
+# how often a duplicate checks on a request running in another worker
+POLL_INTERVAL = 0.1
+
+
+def make_store():
+    # claims and completed responses; with CACHE_URL a retry landing on
+    # another worker waits for, then is answered from, the first one
+    if settings.cache_url:
+        return RedisCache(settings.cache_url)
+    return LocalCache(settings.idempotency_max_entries)
+
+
+def encode_entry(fingerprint: str, status: int, headers, body: bytes | None):
+    # body is None for a response too large to keep: only the fact that the
+    # request completed is recorded
+    meta = {
+        "fingerprint": fingerprint, "status": status, "replayable": body is not None,
+        "headers": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in headers],
+    }
+    return json.dumps(meta).encode() + b"\n" + (body or b"")
+
+
+def decode_entry(raw: bytes):
+    meta, _, body = raw.partition(b"\n")
+    meta = json.loads(meta)
+    headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in meta["headers"]]
+    return meta["fingerprint"], meta["status"], headers, body if meta.get("replayable", True) else None
+
+
+async def send_json(send, status: int, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware():
+    # POSTs carrying an Idempotency-Key run once per (client, path, key).
+    # The first claims the key in the store with a pending marker, so with
+    # CACHE_URL a retry reaching another worker waits too; duplicates in the
+    # same worker wait on a future instead of polling. Later ones get the
+    # stored response back byte for byte, or a 409 when it was larger than
+    # IDEMPOTENCY_MAX_BODY. 5xx responses are not kept, so those retries
+    # run again.
+    def __init__(self, app, exclude_paths: tuple[str, ...] = ("/token",)):
+        self.app = app
+        self.exclude_paths = exclude_paths
+        self.store = make_store()
+        self._in_flight = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = Headers(scope=scope).get("idempotency-key")
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not 0 < len(idempotency_key) <= 255:
+            await send_json(send, 400, "Idempotency-Key must be 1 to 255 characters")
+            return
+
+        body = await self.read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        key = "idempotency:" + hashlib.sha256(
+            "\0".join((client_key(scope), scope["path"], idempotency_key)).encode()
+        ).hexdigest()
+
+        marker = PENDING + fingerprint.encode()
+        while True:
+            raw = await self.store.get(key)
+            if raw is None:
+                if await self.store.add(key, marker, settings.idempotency_lock_ttl):
+                    break
+                continue
+            if not raw.startswith(PENDING):
+                await self.replay(raw, fingerprint, send)
+                return
+            if raw != marker:
+                await send_json(send, 422, "Idempotency-Key was already used with a different request body")
+                return
+            in_flight = self._in_flight.get(key)
+            if in_flight is not None:
+                # shield: a waiter that disconnects must not cancel the future others share
+                await asyncio.shield(in_flight)
+            else:
+                await asyncio.sleep(POLL_INTERVAL)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        stored = False
+        try:
+            stored = await self.run_and_store(scope, body, receive, send, key, fingerprint)
+        finally:
+            if not stored:
+                # release the claim so a retry runs the request again
+                await self.store.delete(key)
+            del self._in_flight[key]
+            future.set_result(None)
+
+    async def read_body(self, receive):
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks)
+
+    async def replay(self, raw: bytes, fingerprint: str, send):
+        stored_fingerprint, status, headers, body = decode_entry(raw)
+        if stored_fingerprint != fingerprint:
+            await send_json(send, 422, "Idempotency-Key was already used with a different request body")
+            return
+        if body is None:
+            await send_json(send, 409, "Response too large to replay")
+            return
+        await send({"type": "http.response.start", "status": status, "headers": headers + [(b"idempotent-replayed", b"true")]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def run_and_store(self, scope, body, receive, send, key, fingerprint):
+        body_sent = False
+
+        async def replay_body():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        start = None
+        chunks = []
+        size = 0
+
+        async def send_and_capture(message):
+            nonlocal start, size
+            if message["type"] == "http.response.start":
+                # copied now: outer middleware edit these headers in place
+                # (Server-Timing, Content-Encoding) once they are passed on
+                start = {"status": message["status"], "headers": list(message.get("headers", []))}
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size <= settings.idempotency_max_body:
+                    chunks.append(chunk)
+            await send(message)
+
+        await self.app(scope, replay_body, send_and_capture)
+        if start is None or start["status"] >= 500:
+            return False
+        stored_body = b"".join(chunks) if size <= settings.idempotency_max_body else None
+        entry = encode_entry(fingerprint, start["status"], start["headers"], stored_body)
+        await self.store.set(key, entry, settings.idempotency_ttl)
+        return True
@@ -0,0 +1,135 @@
+import time
+from anyio import to_thread
+from starlette.routing import Match, Mount
+from cache import product_cache
+from database import engines
+from hashing import hashing_pool
+from replicas import router as replica_router
+from metrics import (
+    CallbackMetric, Counter, Gauge, HistogramMetric, Metric, Registry, LATENCY_BUCKETS, SIZE_BUCKETS,
+)
+from token_cache import token_cache
+from authorization import role_cache
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "http_requests_total", "Requests served, by route template and status code.", ("method", "route", "status"),
+))
+LATENCY = registry.register(HistogramMetric(
+    "http_request_duration_seconds", "Time from request start to the last body chunk.", LATENCY_BUCKETS, ("method", "route"),
+))
+RESPONSE_SIZE = registry.register(HistogramMetric(
+    "http_response_size_bytes", "Response body size as sent.", SIZE_BUCKETS, ("method", "route"),
+))
+IN_FLIGHT = registry.register(Gauge("http_requests_in_flight", "Requests currently being served."))
+
+
+def _threadpool():
+    limiter = to_thread.current_default_thread_limiter()
+    yield {"state": "busy"}, limiter.borrowed_tokens
+    yield {"state": "total"}, limiter.total_tokens
+
+
+def _db_pool():
+    for name, engine in engines.items():
+        pool = engine.pool
+        yield {"engine": name, "state": "checked_out"}, pool.checkedout()
+        yield {"engine": name, "state": "checked_in"}, pool.checkedin()
+        yield {"engine": name, "state": "overflow"}, max(pool.overflow(), 0)
+
+
+class PoolWaitMetric(Metric):
+    kind = "histogram"
+
+    def render(self):
+        lines = self.header()
+        for name, engine in engines.items():
+            lines.extend(engine.pool.wait_histogram.render(self.name, {"engine": name}))
+        return lines
+
+
+def _hashing():
+    stats = hashing_pool.stats()
+    yield {"state": "in_flight"}, stats["in_flight"]
+    yield {"state": "queued"}, stats["queue_depth"]
+
+
+def _caches():
+    yield {"cache": "products", "result": "hit"}, product_cache.hits
+    yield {"cache": "products", "result": "miss"}, product_cache.misses
+    yield {"cache": "tokens", "result": "hit"}, token_cache.hits
+    yield {"cache": "tokens", "result": "miss"}, token_cache.misses
+    yield {"cache": "roles", "result": "hit"}, role_cache.hits
+    yield {"cache": "roles", "result": "miss"}, role_cache.misses
+
+
+registry.register(CallbackMetric("threadpool_tokens", "AnyIO default thread limiter usage.", "gauge", _threadpool))
+registry.register(CallbackMetric("db_pool_connections", "Connections per engine pool.", "gauge", _db_pool))
+registry.register(PoolWaitMetric("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection."))
+registry.register(CallbackMetric("hashing_pool_tasks", "Password hashing work in progress.", "gauge", _hashing))
+registry.register(CallbackMetric(
+    "hashing_pool_rejected_total", "Password operations refused with 429.", "counter",
+    lambda: [({}, hashing_pool.rejected)],
+))
+registry.register(CallbackMetric(
+    "db_replica_lag_seconds", "Replay lag per read replica; absent while a replica is unreachable.", "gauge",
+    lambda: [({"replica": r.name}, r.lag) for r in replica_router.replicas if r.lag is not None],
+))
+registry.register(CallbackMetric("cache_requests_total", "Cache lookups by result.", "counter", _caches))
+
+
+def route_template(scope, path: str, root_path: str):
+    # FastAPI stores the matched APIRoute in the scope. Responses sent before
+    # routing (rate limit 429s, idempotent replays) and mounts such as
+    # /static leave none, so those are matched against the app's routes
+    # using the path as it arrived; a mount rewrites scope["path"]. Raw
+    # paths are never used as labels so ids cannot blow up the series count.
+    route = scope.get("route")
+    if route is not None:
+        return route.path_format
+    router = getattr(scope.get("app"), "router", None)
+    if router is not None:
+        probe = {**scope, "path": path, "root_path": root_path}
+        for route in router.routes:
+            match, _ = route.matches(probe)
+            if match != Match.NONE:
+                return route.path if isinstance(route, Mount) else route.path_format
+    return "unmatched"
+
+
+class MetricsMiddleware():
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        path, root_path = scope["path"], scope.get("root_path", "")
+        end = None
+        status = 500
+        size = 0
+
+        async def send_and_measure(message):
+            nonlocal end, status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if not message.get("more_body", False):
+                    # background tasks run after this, off the client's clock
+                    end = time.perf_counter()
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            IN_FLIGHT.dec()
+            method = scope["method"]
+            route = route_template(scope, path, root_path)
+            REQUESTS.inc((method, route, str(status)))
+            LATENCY.observe((method, route), (end or time.perf_counter()) - start)
+            RESPONSE_SIZE.observe((method, route), size)
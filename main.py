@@ -1,29 +1,101 @@
-from fastapi import Depends, FastAPI, HTTPException,status
+from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, Request, status
 from sqlalchemy.orm import Session
-from typing import Annotated, List
+from typing import Annotated, Literal
 import models
-from database import SessionLocal, engine
-from crud import user_crud,product_crud,address_crud,order_crud,organization_crud,role_crud
-from schemas import user_schemas,product_schemas,address_schemas,order_schemas,organization_schemas, role_schemas
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.context import CryptContext
+from database import engine, engines, async_engine, get_sync_db, get_async_db, warm_pool, warm_async_pool, pool_stats
+from database import SessionLocal, AsyncSessionLocal
+from fastapi.concurrency import run_in_threadpool
+from crud import run_crud, bulk, user_crud,product_crud,address_crud,order_crud,organization_crud,role_crud,token_crud
+from schemas import user_schemas,product_schemas,address_schemas,order_schemas,organization_schemas, role_schemas, bulk_schemas, token_schemas
+from fastapi.security import APIKeyHeader, OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from pydantic import BaseModel
-from fastapi.staticfiles import StaticFiles
+from assets import AssetFiles
+from fastapi.responses import ORJSONResponse
+from hashing import Hasher, hashing_pool
+from token_cache import token_cache
+from authorization import role_cache, has_role
+from api_keys import api_key_index
+from config import settings
+from pagination import Page, PageParams
+from export import export_response
+from serialization import json_response, dump_json
+from cache import product_cache
+from thumbnails import thumbnail_pool
+from etag import table_etag, etag_matches, not_modified
+from querystats import QueryStatsMiddleware
+from idempotency import IdempotencyMiddleware
+from ratelimit import RateLimitMiddleware, rate_limiter
+from compression import CompressionMiddleware
+from replicas import router as replica_router, get_sync_read_db, get_async_read_db
+from instrumentation import MetricsMiddleware, registry
+from fastapi.responses import PlainTextResponse
+from fastapi import Response
+import migrations
 
-models.Base.metadata.create_all(bind=engine)
 # start
-app = FastAPI()
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app = FastAPI(default_response_class=ORJSONResponse)
+app.mount("/static", AssetFiles(directory="static"), name="static")
+# innermost, so replays are stored uncompressed and re-negotiated per client
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(QueryStatsMiddleware)
+if settings.rate_limit_enabled:
+    # outside the app but inside the metrics, so 429s are still counted
+    app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.on_event("startup")
+async def run_migrations():
+    if settings.migrate_on_startup:
+        await run_in_threadpool(migrations.upgrade, engine)
+
+
+@app.on_event("startup")
+async def warm_db_pool():
+    if async_engine is not None:
+        await warm_async_pool(async_engine, settings.db_pool_warm)
+    else:
+        await run_in_threadpool(warm_pool, engine, settings.db_pool_warm)
+
+
+@app.on_event("startup")
+async def start_replica_monitor():
+    await replica_router.start()
+
+
+@app.on_event("shutdown")
+async def stop_replica_monitor():
+    await replica_router.stop()
+
+
+@app.on_event("shutdown")
+def shutdown_hashing_pool():
+    hashing_pool.shutdown()
+
+
+@app.on_event("shutdown")
+def shutdown_thumbnail_pool():
+    thumbnail_pool.shutdown()
+
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    if async_engine is not None:
+        await async_engine.dispose()
 
 # openssl rand -hex 32
 SECRET_KEY = "0b23f983d10e82a45165fa5abbdbc1ed2be224fdd8652567862daeeef75e82b2"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=['bcrypt'],deprecated='auto')
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# same scheme for routes where signing in is optional
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+# organization machine clients send X-API-Key instead of logging in
+api_key_scheme = APIKeyHeader(name="X-API-Key", auto_error=False)
 
 class Token(BaseModel):
     access_token: str
@@ -35,25 +107,13 @@ class TokenData(BaseModel):
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+get_db = get_async_db if settings.db_async else get_sync_db
+# read-only handlers go to a replica when one is configured and caught up
+get_read_db = get_async_read_db if settings.db_async else get_sync_read_db
 
 
 db_dependency = Annotated[Session, Depends(get_db)]
 
-class Hasher():
-    @staticmethod
-    def verify_password(plain_password, hashed_password):
-        return pwd_context.verify(plain_password, hashed_password)
-
-    @staticmethod
-    def get_password_hash(password):
-        return pwd_context.hash(password)
-
 """ def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -71,12 +131,11 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def authenticate_user(db: Session, username: str, password: str):
-    #user = user_crud.get_user(db, username)
-    user = db.query(models.User).filter(models.User.username == username).first() 
+async def authenticate_user(db: Session, username: str, password: str):
+    user = await run_crud(db, user_crud.get_user, username)
     if not user:
         return False
-    if not Hasher.verify_password(password, user.password):
+    if not await Hasher.verify_password_async(password, user.password):
         return False
     return user
 
@@ -88,6 +147,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},    
 	)
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -97,32 +159,90 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
 
-    user = user_crud.get_user(db, username=token_data.username)
+    user = await run_crud(db, user_crud.get_user, token_data.username)
     if user is None:
         raise credentials_exception
+    user = user_schemas.UserRead.model_validate(user)
+    token_cache.set(token, payload.get("exp"), user)
     return user
 
 
+async def get_optional_current_user(token: str | None = Depends(optional_oauth2_scheme), db: Session = Depends(get_db)):
+    if token is None:
+        return None
+    return await get_current_user(token, db)
+
+
+async def load_active_tokens():
+    # own session: the reload is shared and may outlive the request that started it
+    if settings.db_async:
+        async with AsyncSessionLocal() as db:
+            return await run_crud(db, token_crud.get_active_tokens)
+    with SessionLocal() as db:
+        return await run_crud(db, token_crud.get_active_tokens)
+
+
+async def get_api_client(api_key: str | None = Depends(api_key_scheme)):
+    if api_key is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing API key")
+    if api_key_index.stale():
+        await api_key_index.refresh(load_active_tokens)
+    client = api_key_index.lookup(api_key)
+    if client is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired API key")
+    return client
+
+
+async def ensure_role(db: Session, user: user_schemas.UserRead, org_id: int, role: str):
+    # for handlers whose organization is only known from the body or a row
+    if user.id in settings.superuser_ids:
+        return
+    roles = role_cache.get(user.id)
+    if roles is None:
+        version = role_cache.version
+        rows = await run_crud(db, role_crud.get_user_roles, user.id)
+        roles = role_cache.set(user.id, version, rows)
+    if not has_role(roles, org_id, role):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Requires the '{role}' role in organization {org_id}",
+        )
+
+
+def require_role(org: int | str, role: str):
+    # `org` is a fixed organization id or the name of the path parameter
+    # holding it, e.g. require_role("org_id", "admin")
+    async def check_role(
+        request: Request,
+        current_user: user_schemas.UserRead = Depends(get_current_user),
+        db: Session = Depends(get_db),
+    ):
+        org_id = org if isinstance(org, int) else int(request.path_params[org])
+        await ensure_role(db, current_user, org_id, role)
+        return current_user
+    return check_role
+
+
 
 @app.post("/users/create/", response_model=user_schemas.UserCreate)
-def create_user(user: user_schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user_by_username = user_crud.get_user(db, username=user.username)
+async def create_user(user: user_schemas.UserCreate, db: Session = Depends(get_db)):
+    db_user_by_username = await run_crud(db, user_crud.get_user, user.username)
     if db_user_by_username:
         raise HTTPException(status_code=400, detail="Username already exists")
 
-    hashed_password = Hasher.get_password_hash(user.password)
+    hashed_password = await Hasher.get_password_hash_async(user.password)
 
     user_data = user.model_dump()
     user_data['password'] = hashed_password
 
-    db_user = user_crud.create_user(db=db, user=user_schemas.UserCreate(**user_data))
+    db_user = await run_crud(db, user_crud.create_user, user_schemas.UserCreate(**user_data))
     return db_user
 
 
 @app.post("/token", response_model=Token)
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -136,10 +256,15 @@ async def login_for_access_token(
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-@app.get("/users/", response_model=List[user_schemas.UserRead])
-def read_users(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
-    users = user_crud.get_users(db, skip=skip, limit=limit)
-    return users
+@app.get("/users/", response_model=Page[user_schemas.UserRead])
+async def read_users(page: PageParams = Depends(), db: Session = Depends(get_read_db)):
+    users, next_cursor = await run_crud(db, user_crud.get_users, page.after, page.limit)
+    return json_response(Page[user_schemas.UserRead], {"items": users, "next_cursor": next_cursor})
+
+@app.get("/users/batch", response_model=bulk_schemas.BatchRead[user_schemas.UserRead])
+async def read_users_batch(ids: str, db: Session = Depends(get_read_db)):
+    found, missing = await run_crud(db, user_crud.get_users_by_ids, bulk.parse_ids(ids))
+    return json_response(bulk_schemas.BatchRead[user_schemas.UserRead], {"items": found, "missing": missing})
 
 @app.get("/users/me/", response_model=user_schemas.UserRead)
 async def read_users_me(
@@ -149,49 +274,49 @@ async def read_users_me(
 
 
 @app.put("/users/update/{user_id}")
-def update_user(user_id: int, user: user_schemas.UserUpdate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+async def update_user(user_id: int, user: user_schemas.UserUpdate, db: Session = Depends(get_db)):
+    db_user = await run_crud(db, user_crud.update_user, user_id, user)
 
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    for attr, value in user.model_dump(exclude_unset=True).items():
-        if value is not None:
-            setattr(db_user, attr, value)
-
-    db.commit()
-    db.refresh(db_user)
+    token_cache.invalidate_user(user_id)
     return db_user
 
 
 @app.delete("/users/delete/{user_id}")
-def delete_user(user_id: int, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+async def delete_user(user_id: int, db: Session = Depends(get_db)):
+    deleted = await run_crud(db, user_crud.delete_user, user_id)
 
-    if not db_user:
+    if not deleted:
         raise HTTPException(status_code=404, detail="User not found")
     
-    db.delete(db_user)
-    db.commit()
+    token_cache.invalidate_user(user_id)
+    role_cache.invalidate()
     return {"Message":"User ID {user_id} Deleted "}
 
 
 
-@app.get("/addresses/", response_model=list[address_schemas.AddressRead])
-def read_addresses(db: Session = Depends(get_db)):
-    db_address = address_crud.get_addresses(db)
-    return db_address
+@app.get("/addresses/", response_model=Page[address_schemas.AddressRead])
+async def read_addresses(page: PageParams = Depends(), db: Session = Depends(get_read_db)):
+    db_address, next_cursor = await run_crud(db, address_crud.get_addresses, page.after, page.limit)
+    return json_response(Page[address_schemas.AddressRead], {"items": db_address, "next_cursor": next_cursor})
+
+@app.get("/addresses/batch", response_model=bulk_schemas.BatchRead[address_schemas.AddressRead])
+async def read_addresses_batch(ids: str, db: Session = Depends(get_read_db)):
+    found, missing = await run_crud(db, address_crud.get_addresses_by_ids, bulk.parse_ids(ids))
+    return json_response(bulk_schemas.BatchRead[address_schemas.AddressRead], {"items": found, "missing": missing})
 
 @app.get("/addresses/{address_id}", response_model=address_schemas.AddressRead)
-def read_address(address_id: int, db: Session = Depends(get_db)):
-    address = address_crud.get_address_by_id(db, address_id)
+async def read_address(address_id: int, db: Session = Depends(get_read_db)):
+    address = await run_crud(db, address_crud.get_address_by_id, address_id)
     if address is None:
         raise HTTPException(status_code=404, detail="Address not found")
     return address
 
 @app.post("/addresses/", response_model=address_schemas.AddressCreate)
-def create_new_address(address_data: address_schemas.AddressCreate, db: Session = Depends(get_db)):
-    return address_crud.create_address(db, address_data)
+async def create_new_address(address_data: address_schemas.AddressCreate, db: Session = Depends(get_db)):
+    return await run_crud(db, address_crud.create_address, address_data)
 
 
 
@@ -199,138 +324,357 @@ def create_new_address(address_data: address_schemas.AddressCreate, db: Session
 async def update_existing_address(
     address_id: int, address_data: address_schemas.AddressUpdate, db: Session = Depends(get_db)
 ):
-    return address_crud.update_address(db, address_id, address_data)
+    return await run_crud(db, address_crud.update_address, address_id, address_data)
 
 @app.delete("/addresses/{address_id}")
-def delete_existing_address(address_id: int, db: Session = Depends(get_db)):
-    address = address_crud.get_address_by_id(db, address_id)
-    if address is None:
-        raise HTTPException(status_code=404, detail="Address not found")
-    return address_crud.delete_address(db, address_id)
-
-
-@app.get("/organizations/", response_model=list[organization_schemas.OrgRead])
-def read_organizations(db: Session = Depends(get_db)):
-    db_org = organization_crud.get_organization(db)
-    return db_org
+async def delete_existing_address(address_id: int, db: Session = Depends(get_db)):
+    return await run_crud(db, address_crud.delete_address, address_id)
+
+@app.post("/bulk_create_addresses/", response_model=list[address_schemas.AddressRead])
+async def bulk_create_addresses(items: list[address_schemas.AddressCreate], db: Session = Depends(get_db)):
+    created = await run_crud(db, address_crud.bulk_create_addresses, items)
+    return json_response(list[address_schemas.AddressRead], created)
+
+@app.put("/bulk_update_addresses/", response_model=list[bulk_schemas.BulkItemResult])
+async def bulk_update_addresses(items: list[address_schemas.AddressBulkUpdate], db: Session = Depends(get_db)):
+    return await run_crud(db, address_crud.bulk_update_addresses, items)
+
+@app.delete("/bulk_delete_addresses/", response_model=list[bulk_schemas.BulkItemResult])
+async def bulk_delete_addresses(ids: list[int], db: Session = Depends(get_db)):
+    return await run_crud(db, address_crud.bulk_delete_addresses, ids)
+
+
+@app.get("/organizations/", response_model=Page[organization_schemas.OrgRead])
+async def read_organizations(request: Request, page: PageParams = Depends(), db: Session = Depends(get_read_db)):
+    etag = await table_etag(db, "organization", "page", page.after, page.limit)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    db_org, next_cursor = await run_crud(db, organization_crud.get_organization, page.after, page.limit)
+    return json_response(Page[organization_schemas.OrgRead], {"items": db_org, "next_cursor": next_cursor}, headers={"ETag": etag})
+
+@app.get("/organizations/batch", response_model=bulk_schemas.BatchRead[organization_schemas.OrgRead])
+async def read_organizations_batch(request: Request, ids: str, db: Session = Depends(get_read_db)):
+    ids = bulk.parse_ids(ids)
+    etag = await table_etag(db, "organization", "batch", *ids)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    found, missing = await run_crud(db, organization_crud.get_organizations_by_ids, ids)
+    return json_response(bulk_schemas.BatchRead[organization_schemas.OrgRead], {"items": found, "missing": missing}, headers={"ETag": etag})
 
 @app.get("/organizations/{org_id}", response_model=organization_schemas.OrgRead)
-def read_organization_by_id(org_id: int, db: Session = Depends(get_db)):
-    organization = organization_crud.get_organization_by_id(db, org_id)
+async def read_organization_by_id(request: Request, org_id: int, db: Session = Depends(get_read_db)):
+    etag = await table_etag(db, "organization", "item", org_id)
+    if etag_matches(request, etag, wildcard=False):
+        return not_modified(etag)
+    organization = await run_crud(db, organization_crud.get_organization_by_id, org_id)
     if organization is None:
         raise HTTPException(status_code=404, detail="Organization not found")
-    return organization
+    return json_response(organization_schemas.OrgRead, organization, headers={"ETag": etag})
 
 @app.post("/create_organization/", response_model=organization_schemas.OrgCreate)
-def create_new_organization(org_data: organization_schemas.OrgCreate, db: Session = Depends(get_db)):
-    return organization_crud.create_organization(db, org_data)
-
-@app.put("/update_organization/{org_id}")
-def update_existing_organization(org_id: int, org_data:organization_schemas.OrgUpdate, db: Session = Depends(get_db)):
-    organization = organization_crud.get_organization_by_id(db, org_id)
-    if organization is None:
-        raise HTTPException(status_code=404, detail="Organization not found")
-    return organization_crud.update_organization(db, org_id, org_data)
-
-@app.delete("/delete_organization/{org_id}")
-def delete_existing_organization(org_id: int, db: Session = Depends(get_db)):
-    organization = organization_crud.get_organization_by_id(db, org_id)
-    if organization is None:
-        raise HTTPException(status_code=404, detail="Organization not found")
-    return organization_crud.delete_organization(db, org_id)
+async def create_new_organization(
+    org_data: organization_schemas.OrgCreate,
+    current_user: user_schemas.UserRead | None = Depends(get_optional_current_user),
+    db: Session = Depends(get_db),
+):
+    # a signed-in creator becomes the organization's first admin, which is
+    # what lets anyone manage its roles and API keys afterwards
+    admin_id = current_user.id if current_user is not None else None
+    organization = await run_crud(db, organization_crud.create_organization, org_data, admin_id)
+    if admin_id is not None:
+        role_cache.invalidate()
+    return organization
 
+@app.put("/update_organization/{org_id}", dependencies=[Depends(require_role("org_id", "admin"))])
+async def update_existing_organization(org_id: int, org_data:organization_schemas.OrgUpdate, db: Session = Depends(get_db)):
+    return await run_crud(db, organization_crud.update_organization, org_id, org_data)
+
+@app.delete("/delete_organization/{org_id}", dependencies=[Depends(require_role("org_id", "admin"))])
+async def delete_existing_organization(org_id: int, db: Session = Depends(get_db)):
+    result = await run_crud(db, organization_crud.delete_organization, org_id)
+    # its roles and API keys went with it
+    role_cache.invalidate()
+    api_key_index.invalidate()
+    return result
+
+
+async def generate_thumbnails(prod_id: int, images: list[str]):
+    # runs after the response is sent; the write itself never waits on Pillow
+    if not images:
+        return
+    thumbs = await thumbnail_pool.render(images)
+    if settings.db_async:
+        async with AsyncSessionLocal() as db:
+            updated = await run_crud(db, product_crud.set_thumbnails, prod_id, images, thumbs)
+    else:
+        with SessionLocal() as db:
+            updated = await run_crud(db, product_crud.set_thumbnails, prod_id, images, thumbs)
+    if updated:
+        await product_cache.invalidate()
 
 @app.post("/create_product/", response_model=product_schemas.ProductCreate)
-def create_new_product(product_data: product_schemas.ProductCreate, db: Session = Depends(get_db)):
-    return product_crud.create_product(db, product_data)
+async def create_new_product(
+    product_data: product_schemas.ProductCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+):
+    product = await run_crud(db, product_crud.create_product, product_data)
+    await product_cache.invalidate()
+    if thumbnail_pool.enabled:
+        background_tasks.add_task(generate_thumbnails, product.id, product.prod_image)
+    return product
 
-@app.get("/products/", response_model=list[product_schemas.ProductRead])
-def read_products(db: Session = Depends(get_db)):
-    db_prod = product_crud.get_products(db)
-    return db_prod
+# Product reads stay on the primary: they fill the shared catalog cache, and
+# a lagging replica would leave stale rows cached under the new generation.
+@app.get("/products/", response_model=Page[product_schemas.ProductRead])
+async def read_products(request: Request, page: PageParams = Depends(), db: Session = Depends(get_db)):
+    etag = await table_etag(db, "product", "page", page.after, page.limit)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    key = await product_cache.key("page", page.after, page.limit)
+    body = await product_cache.get(key)
+    if body is None:
+        db_prod, next_cursor = await run_crud(db, product_crud.get_products, page.after, page.limit)
+        body = dump_json(Page[product_schemas.ProductRead], {"items": db_prod, "next_cursor": next_cursor})
+        await product_cache.set(key, body)
+    return Response(body, media_type="application/json", headers={"ETag": etag})
+
+@app.get("/products/export")
+def export_products(format: Literal["ndjson", "json"] = "ndjson"):
+    return export_response(models.Product, product_schemas.ProductRead, format)
+
+@app.get("/products/batch", response_model=bulk_schemas.BatchRead[product_schemas.ProductRead])
+async def read_products_batch(request: Request, ids: str, db: Session = Depends(get_db)):
+    ids = bulk.parse_ids(ids)
+    etag = await table_etag(db, "product", "batch", *ids)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    found, missing = await run_crud(db, product_crud.get_products_by_ids, ids)
+    return json_response(bulk_schemas.BatchRead[product_schemas.ProductRead], {"items": found, "missing": missing}, headers={"ETag": etag})
 
 @app.get("/products/{prod_id}", response_model=product_schemas.ProductRead)
-def read_product_by_id(prod_id: int, db: Session = Depends(get_db)):
-    product = product_crud.get_product_by_id(db, prod_id)
-    if product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+async def read_product_by_id(request: Request, prod_id: int, db: Session = Depends(get_db)):
+    etag = await table_etag(db, "product", "item", prod_id)
+    if etag_matches(request, etag, wildcard=False):
+        return not_modified(etag)
+    key = await product_cache.key("item", prod_id)
+    body = await product_cache.get(key)
+    if body is None:
+        product = await run_crud(db, product_crud.get_product_by_id, prod_id)
+        if product is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        body = dump_json(product_schemas.ProductRead, product)
+        await product_cache.set(key, body)
+    return Response(body, media_type="application/json", headers={"ETag": etag})
 
 @app.put("/update_product/{prod_id}")
-def update_existing_product(prod_id: int, prod_data:product_schemas.ProductUpdate, db: Session = Depends(get_db)):
-    product = product_crud.get_product_by_id(db, prod_id)
-    if product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product_crud.update_product(db, prod_id, prod_data)
+async def update_existing_product(
+    prod_id: int, prod_data:product_schemas.ProductUpdate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+):
+    product = await run_crud(db, product_crud.update_product, prod_id, prod_data)
+    await product_cache.invalidate()
+    if thumbnail_pool.enabled and "prod_image" in prod_data.model_fields_set:
+        background_tasks.add_task(generate_thumbnails, product.id, product.prod_image)
+    return product
 
 
 
 @app.delete("/delete_product/{prod_id}")
-def delete_existing_product(prod_id: int, db: Session = Depends(get_db)):
-    product = product_crud.get_product_by_id(db, prod_id)
-    if product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product_crud.delete_product(db, prod_id)
-
+async def delete_existing_product(prod_id: int, db: Session = Depends(get_db)):
+    result = await run_crud(db, product_crud.delete_product, prod_id)
+    await product_cache.invalidate()
+    return result
+
+@app.post("/bulk_create_products/", response_model=list[product_schemas.ProductRead])
+async def bulk_create_products(items: list[product_schemas.ProductCreate], db: Session = Depends(get_db)):
+    created = await run_crud(db, product_crud.bulk_create_products, items)
+    await product_cache.invalidate()
+    return json_response(list[product_schemas.ProductRead], created)
+
+@app.put("/bulk_update_products/", response_model=list[bulk_schemas.BulkItemResult])
+async def bulk_update_products(items: list[product_schemas.ProductBulkUpdate], db: Session = Depends(get_db)):
+    results = await run_crud(db, product_crud.bulk_update_products, items)
+    await product_cache.invalidate()
+    return results
+
+@app.delete("/bulk_delete_products/", response_model=list[bulk_schemas.BulkItemResult])
+async def bulk_delete_products(ids: list[int], db: Session = Depends(get_db)):
+    results = await run_crud(db, product_crud.bulk_delete_products, ids)
+    await product_cache.invalidate()
+    return results
+
+
+
+@app.get("/orders/", response_model=Page[order_schemas.OrderExpanded], response_model_exclude_unset=True)
+async def read_orders(expand: str | None = None, page: PageParams = Depends(), db: Session = Depends(get_read_db)):
+    expand = order_crud.parse_expand(expand)
+    db_order, next_cursor = await run_crud(db, order_crud.get_orders, page.after, page.limit, expand)
+    return json_response(
+        Page[order_schemas.OrderExpanded], {"items": db_order, "next_cursor": next_cursor}, exclude_unset=True,
+    )
 
+@app.get("/orders/export")
+def export_orders(format: Literal["ndjson", "json"] = "ndjson"):
+    return export_response(models.Order, order_schemas.OrderRead, format)
 
-@app.get("/orders/", response_model=list[order_schemas.OrderRead])
-def read_orders(db: Session = Depends(get_db)):
-    db_order = order_crud.get_orders(db)
-    return db_order
+@app.get("/orders/batch", response_model=bulk_schemas.BatchRead[order_schemas.OrderRead])
+async def read_orders_batch(ids: str, db: Session = Depends(get_read_db)):
+    found, missing = await run_crud(db, order_crud.get_orders_by_ids, bulk.parse_ids(ids))
+    return json_response(bulk_schemas.BatchRead[order_schemas.OrderRead], {"items": found, "missing": missing})
 
-@app.get("/orders/{order_id}", response_model=order_schemas.OrderRead)
-def read_order_by_id(order_id: int, db: Session = Depends(get_db)):
-    order = order_crud.get_order_by_id(db, order_id)
+@app.get("/orders/{order_id}", response_model=order_schemas.OrderExpanded, response_model_exclude_unset=True)
+async def read_order_by_id(order_id: int, expand: str | None = None, db: Session = Depends(get_read_db)):
+    order = await run_crud(db, order_crud.get_order_by_id, order_id, order_crud.parse_expand(expand))
     if order is None:
         raise HTTPException(status_code=404, detail="Order not found")
-    return order
+    return json_response(order_schemas.OrderExpanded, order, exclude_unset=True)
 
 @app.post("/create_order/", response_model=order_schemas.OrderCreate)
-def create_new_order(order_data: order_schemas.OrderCreate, db: Session = Depends(get_db)):
-    return order_crud.create_order(db, order_data)
+async def create_new_order(order_data: order_schemas.OrderCreate, db: Session = Depends(get_db)):
+    return await run_crud(db, order_crud.create_order, order_data)
+
+@app.post("/checkout/", response_model=order_schemas.CheckoutRead)
+async def checkout(checkout_data: order_schemas.CheckoutCreate, db: Session = Depends(get_db)):
+    order = await run_crud(db, order_crud.checkout, checkout_data)
+    return json_response(order_schemas.CheckoutRead, order)
 
 @app.put("/update_order/{order_id}")
-def update_existing_order(order_id: int, order_data: order_schemas.OrderUpdate, db: Session = Depends(get_db)):
-    order = order_crud.get_order_by_id(db, order_id)
-    if order is None:
-        raise HTTPException(status_code=404, detail="Order not found")
-    return order_crud.update_order(db, order_id, order_data)
+async def update_existing_order(order_id: int, order_data: order_schemas.OrderUpdate, db: Session = Depends(get_db)):
+    return await run_crud(db, order_crud.update_order, order_id, order_data)
 
 @app.delete("/delete_order/{order_id}")
-def delete_existing_order(order_id: int, db: Session = Depends(get_db)):
-    order = order_crud.get_order_by_id(db, order_id)
-    if order is None:
-        raise HTTPException(status_code=404, detail="Order not found")
-    return order_crud.delete_order(db, order_id)
-
-@app.get("/roles/", response_model=list[role_schemas.RoleRead])
-def read_roles(db: Session = Depends(get_db)):
-    db_role = role_crud.get_roles(db)
-    return db_role
+async def delete_existing_order(order_id: int, db: Session = Depends(get_db)):
+    return await run_crud(db, order_crud.delete_order, order_id)
+
+@app.post("/bulk_create_orders/", response_model=list[order_schemas.OrderRead])
+async def bulk_create_orders(items: list[order_schemas.OrderCreate], db: Session = Depends(get_db)):
+    created = await run_crud(db, order_crud.bulk_create_orders, items)
+    return json_response(list[order_schemas.OrderRead], created)
+
+@app.put("/bulk_update_orders/", response_model=list[bulk_schemas.BulkItemResult])
+async def bulk_update_orders(items: list[order_schemas.OrderBulkUpdate], db: Session = Depends(get_db)):
+    return await run_crud(db, order_crud.bulk_update_orders, items)
+
+@app.delete("/bulk_delete_orders/", response_model=list[bulk_schemas.BulkItemResult])
+async def bulk_delete_orders(ids: list[int], db: Session = Depends(get_db)):
+    return await run_crud(db, order_crud.bulk_delete_orders, ids)
+
+@app.get("/roles/", response_model=Page[role_schemas.RoleRead])
+async def read_roles(request: Request, page: PageParams = Depends(), db: Session = Depends(get_read_db)):
+    etag = await table_etag(db, "role", "page", page.after, page.limit)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    db_role, next_cursor = await run_crud(db, role_crud.get_roles, page.after, page.limit)
+    return json_response(Page[role_schemas.RoleRead], {"items": db_role, "next_cursor": next_cursor}, headers={"ETag": etag})
+
+@app.get("/roles/batch", response_model=bulk_schemas.BatchRead[role_schemas.RoleRead])
+async def read_roles_batch(request: Request, ids: str, db: Session = Depends(get_read_db)):
+    ids = bulk.parse_ids(ids)
+    etag = await table_etag(db, "role", "batch", *ids)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    found, missing = await run_crud(db, role_crud.get_roles_by_ids, ids)
+    return json_response(bulk_schemas.BatchRead[role_schemas.RoleRead], {"items": found, "missing": missing}, headers={"ETag": etag})
 
 @app.get("/roles/{role_id}", response_model=role_schemas.RoleRead)
-def read_role_by_id(role_id: int, db: Session = Depends(get_db)):
-    role = role_crud.get_role_by_id(db, role_id)
+async def read_role_by_id(request: Request, role_id: int, db: Session = Depends(get_read_db)):
+    etag = await table_etag(db, "role", "item", role_id)
+    if etag_matches(request, etag, wildcard=False):
+        return not_modified(etag)
+    role = await run_crud(db, role_crud.get_role_by_id, role_id)
     if role is None:
         raise HTTPException(status_code=404, detail="Role not found")
-    return role
+    return json_response(role_schemas.RoleRead, role, headers={"ETag": etag})
 
 @app.post("/create_role/", response_model=role_schemas.RoleCreate)
-def create_new_role(role_data: role_schemas.RoleCreate, db: Session = Depends(get_db)):
-    return role_crud.create_role(db, role_data)
+async def create_new_role(
+    role_data: role_schemas.RoleCreate,
+    current_user: user_schemas.UserRead = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    await ensure_role(db, current_user, role_data.org_id, "admin")
+    role = await run_crud(db, role_crud.create_role, role_data)
+    role_cache.invalidate()
+    return role
 
 @app.put("/update_role/{role_id}")
-def update_existing_role(role_id: int, role_data: role_schemas.RoleUpdate, db: Session = Depends(get_db)):
-    role = role_crud.get_role_by_id(db, role_id)
-    if role is None:
+async def update_existing_role(
+    role_id: int,
+    role_data: role_schemas.RoleUpdate,
+    current_user: user_schemas.UserRead = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    existing = await run_crud(db, role_crud.get_role_by_id, role_id)
+    if existing is None:
         raise HTTPException(status_code=404, detail="Role not found")
-    return role_crud.update_role(db, role_id, role_data)
+    # moving a role needs admin rights on both sides
+    await ensure_role(db, current_user, existing.org_id, "admin")
+    await ensure_role(db, current_user, role_data.org_id, "admin")
+    role = await run_crud(db, role_crud.update_role, role_id, role_data)
+    role_cache.invalidate()
+    return role
 
 @app.delete("/delete_role/{role_id}")
-def delete_existing_role(role_id: int, db: Session = Depends(get_db)):
-    role = role_crud.get_role_by_id(db, role_id)
-    if role is None:
+async def delete_existing_role(
+    role_id: int,
+    current_user: user_schemas.UserRead = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    existing = await run_crud(db, role_crud.get_role_by_id, role_id)
+    if existing is None:
         raise HTTPException(status_code=404, detail="Role not found")
-    return role_crud.delete_role(db, role_id)
+    await ensure_role(db, current_user, existing.org_id, "admin")
+    result = await run_crud(db, role_crud.delete_role, role_id)
+    role_cache.invalidate()
+    return result
+
+
+@app.get("/api_client/me/")
+async def read_api_client_me(client = Depends(get_api_client)):
+    return {"token_id": client.token_id, "org_id": client.org_id}
+
+@app.get("/organizations/{org_id}/tokens", response_model=list[token_schemas.TokenRead], dependencies=[Depends(require_role("org_id", "admin"))])
+async def read_org_tokens(org_id: int, db: Session = Depends(get_db)):
+    return await run_crud(db, token_crud.get_tokens, org_id)
+
+@app.post("/organizations/{org_id}/tokens", response_model=token_schemas.TokenIssued, dependencies=[Depends(require_role("org_id", "admin"))])
+async def create_org_token(org_id: int, token_data: token_schemas.TokenCreate, db: Session = Depends(get_db)):
+    token = await run_crud(db, token_crud.create_token, org_id, token_data)
+    api_key_index.invalidate()
+    return token
+
+@app.delete("/organizations/{org_id}/tokens/{token_id}", dependencies=[Depends(require_role("org_id", "admin"))])
+async def delete_org_token(org_id: int, token_id: int, db: Session = Depends(get_db)):
+    result = await run_crud(db, token_crud.delete_token, org_id, token_id)
+    api_key_index.invalidate()
+    return result
+
+
+@app.get("/internal/hashing", include_in_schema=False)
+def read_hashing_stats():
+    return hashing_pool.stats()
+
+
+@app.get("/internal/pool", include_in_schema=False)
+def read_pool_stats():
+    return {name: pool_stats(db_engine) for name, db_engine in engines.items()}
+
+
+@app.get("/internal/replicas", include_in_schema=False)
+async def read_replica_stats():
+    return replica_router.stats()
+
+@app.get("/internal/thumbnails", include_in_schema=False)
+async def read_thumbnail_stats():
+    return thumbnail_pool.stats()
+
+@app.get("/internal/ratelimit", include_in_schema=False)
+async def read_rate_limit_stats():
+    return rate_limiter.stats()
+
+@app.get("/internal/cache", include_in_schema=False)
+def read_cache_stats():
+    return {"products": product_cache.stats(), "roles": role_cache.stats(), "api_keys": api_key_index.stats()}
+
 
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
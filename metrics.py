@@ -0,0 +1,165 @@
+import bisect
+import threading
+
+# Metric primitives for the /metrics endpoint. Request-path updates happen on
+# the event loop thread only, so plain dict and list increments are safe
+# without locks. Values updated from worker threads, such as pool checkout
+# waits, use LockedHistogram instead.
+
+
+def _format_labels(labels: dict):
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + inner + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram():
+    # Fixed buckets chosen up front, so observing is a bisect and an increment.
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else repr(bound)] = cumulative
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+    def render(self, name: str, labels: dict):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(self.sum)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {self.count}")
+        return lines
+
+
+class LockedHistogram(Histogram):
+    # For observations made off the event loop: sync handlers check out
+    # connections from the threadpool, several threads at a time.
+    def __init__(self, buckets):
+        super().__init__(buckets)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            super().observe(value)
+
+    def snapshot(self):
+        with self._lock:
+            return super().snapshot()
+
+    def render(self, name: str, labels: dict):
+        with self._lock:
+            return super().render(name, labels)
+
+
+class Metric():
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, description, labelnames=()):
+        super().__init__(name, description, labelnames)
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        return self.header() + [
+            f"{self.name}{_format_labels(dict(zip(self.labelnames, labels)))} {_format_value(value)}"
+            for labels, value in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels=(), amount=1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+
+class HistogramMetric(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, description, buckets, labelnames=()):
+        super().__init__(name, description, labelnames)
+        self.bucket_bounds = buckets
+        self.histograms = {}
+
+    def observe(self, labels, value):
+        histogram = self.histograms.get(labels)
+        if histogram is None:
+            histogram = self.histograms[labels] = Histogram(self.bucket_bounds)
+        histogram.observe(value)
+
+    def render(self):
+        lines = self.header()
+        for labels, histogram in self.histograms.items():
+            lines.extend(histogram.render(self.name, dict(zip(self.labelnames, labels))))
+        return lines
+
+
+class CallbackMetric(Metric):
+    # Values computed at scrape time: callback() yields (labels dict, value).
+    def __init__(self, name, description, kind, callback):
+        super().__init__(name, description)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self):
+        return self.header() + [
+            f"{self.name}{_format_labels(labels)} {_format_value(value)}" for labels, value in self.callback()
+        ]
+
+
+class Registry():
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
@@ -0,0 +1,62 @@
+import importlib
+import pkgutil
+from sqlalchemy import text
+
+# arbitrary constant shared by every worker so only one of them migrates at a time
+LOCK_ID = 7_312_004_118
+
+
+def load_migrations():
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        if info.name[:1] == "m" and info.name[1:5].isdigit():
+            migrations.append(importlib.import_module(f"{__name__}.{info.name}"))
+    return sorted(migrations, key=lambda m: m.revision)
+
+
+def current_version(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, description TEXT, applied_at TIMESTAMP DEFAULT now())"
+    ))
+    return conn.execute(text("SELECT coalesce(max(version), 0) FROM schema_version")).scalar()
+
+
+def upgrade(engine):
+    applied = []
+    # AUTOCOMMIT so migrations can run CREATE INDEX CONCURRENTLY; each
+    # migration opens its own transaction when it is transactional.
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": LOCK_ID})
+        try:
+            version = current_version(conn)
+            for migration in load_migrations():
+                if migration.revision <= version:
+                    continue
+                if getattr(migration, "transactional", True):
+                    with engine.begin() as tx:
+                        migration.upgrade(tx)
+                else:
+                    migration.upgrade(conn)
+                conn.execute(
+                    text("INSERT INTO schema_version (version, description) VALUES (:v, :d)"),
+                    {"v": migration.revision, "d": migration.description},
+                )
+                applied.append(migration.revision)
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": LOCK_ID})
+    return applied
+
+
+def create_index_concurrently(conn, name: str, table: str, columns: str, unique: bool = False):
+    # A failed CONCURRENTLY build leaves an INVALID index behind that
+    # IF NOT EXISTS would happily skip, so drop it and build again.
+    invalid = conn.execute(text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {"name": name}).first()
+    if invalid:
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+    conn.execute(text(
+        f'CREATE {"UNIQUE " if unique else ""}INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" ({columns})'
+    ))
@@ -0,0 +1,5 @@
+from database import engine
+from migrations import upgrade
+
+applied = upgrade(engine)
+print(f"applied migrations: {applied}" if applied else "database is up to date")
@@ -0,0 +1,82 @@
+from sqlalchemy import text
+
+revision = 1
+description = "baseline tables previously created by create_all"
+
+# The schema exactly as create_all left it before migrations existed, frozen
+# here so later revisions create their own columns and indexes. IF NOT EXISTS
+# keeps it a no-op on databases that create_all already set up.
+STATEMENTS = [
+    """
+    DO $$ BEGIN
+        CREATE TYPE genderenum AS ENUM ('MALE', 'FEMALE', 'OTHER');
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS organization (
+        id SERIAL PRIMARY KEY,
+        org_name VARCHAR UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS product (
+        id SERIAL PRIMARY KEY,
+        prod_name VARCHAR UNIQUE,
+        prod_og_price NUMERIC,
+        prod_new_price NUMERIC,
+        prod_desc TEXT,
+        prod_image VARCHAR[],
+        prod_thumb_img VARCHAR[]
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS "user" (
+        id SERIAL PRIMARY KEY,
+        username VARCHAR,
+        first_name VARCHAR,
+        last_name VARCHAR,
+        email VARCHAR UNIQUE,
+        phone VARCHAR UNIQUE,
+        country_code VARCHAR,
+        password VARCHAR,
+        gender genderenum NOT NULL,
+        is_active BOOLEAN
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS address (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER REFERENCES "user" (id),
+        address_line1 TEXT,
+        address_line2 TEXT,
+        city VARCHAR,
+        postal_code INTEGER,
+        state VARCHAR,
+        country VARCHAR
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS "order" (
+        id SERIAL PRIMARY KEY,
+        prod_id INTEGER REFERENCES product (id),
+        ord_date TIMESTAMP WITHOUT TIME ZONE,
+        org_id INTEGER REFERENCES organization (id),
+        ord_price NUMERIC,
+        user_id INTEGER REFERENCES "user" (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS role (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER REFERENCES "user" (id),
+        org_id INTEGER REFERENCES organization (id),
+        role VARCHAR
+    )
+    """,
+]
+
+
+def upgrade(conn):
+    for statement in STATEMENTS:
+        conn.execute(text(statement))
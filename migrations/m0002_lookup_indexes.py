@@ -0,0 +1,21 @@
+from migrations import create_index_concurrently
+
+revision = 2
+description = "indexes on user.username, foreign keys and order.ord_date"
+transactional = False
+
+INDEXES = [
+    ("ix_user_username", "user", "username", True),
+    ("ix_order_user_id", "order", "user_id", False),
+    ("ix_order_org_id", "order", "org_id", False),
+    ("ix_order_prod_id", "order", "prod_id", False),
+    ("ix_order_ord_date", "order", "ord_date", False),
+    ("ix_address_user_id", "address", "user_id", False),
+    ("ix_role_user_id", "role", "user_id", False),
+    ("ix_role_org_id", "role", "org_id", False),
+]
+
+
+def upgrade(conn):
+    for name, table, columns, unique in INDEXES:
+        create_index_concurrently(conn, name, table, columns, unique=unique)
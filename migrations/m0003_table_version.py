@@ -0,0 +1,8 @@
+import models
+
+revision = 3
+description = "per-table change counters behind the read endpoint ETags"
+
+
+def upgrade(conn):
+    models.TableVersion.__table__.create(conn, checkfirst=True)
@@ -0,0 +1,8 @@
+import models
+
+revision = 4
+description = "organization API tokens"
+
+
+def upgrade(conn):
+    models.Token.__table__.create(conn, checkfirst=True)
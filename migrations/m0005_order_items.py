@@ -0,0 +1,10 @@
+from sqlalchemy import text
+import models
+
+revision = 5
+description = "order line items and order.total_orders"
+
+
+def upgrade(conn):
+    conn.execute(text('ALTER TABLE "order" ADD COLUMN IF NOT EXISTS total_orders INTEGER'))
+    models.OrderItem.__table__.create(conn, checkfirst=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Text, Numeric
+from sqlalchemy import BigInteger, Boolean, Column, ForeignKey, Integer, String, DateTime, Text, Numeric
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import ARRAY
 from database import Base
@@ -16,7 +16,7 @@ class User(Base):
     __tablename__ = "user"
 
     id = Column(Integer, primary_key=True)
-    username = Column(String) 
+    username = Column(String, unique=True, index=True)
     first_name = Column(String)
     last_name = Column(String)
     email = Column(String, unique=True)
@@ -37,6 +37,7 @@ class Organization(Base):
     id = Column(Integer, primary_key=True)
     org_name = Column(String,unique=True)
 
+    token_relation = relationship("Token",back_populates="organization_relation")
     order_relation = relationship("Order", back_populates="organization_relation")
     user_relation = relationship("User",secondary="role",back_populates="organization_relation")
 
@@ -44,8 +45,8 @@ class Role(Base):
     __tablename__ = "role"
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("user.id"))
-    org_id = Column(Integer, ForeignKey("organization.id"))
+    user_id = Column(Integer, ForeignKey("user.id"), index=True)
+    org_id = Column(Integer, ForeignKey("organization.id"), index=True)
     role = Column(String)
     
 
@@ -66,22 +67,36 @@ class Order(Base):
     __tablename__ = "order"
 
     id = Column(Integer,primary_key=True)
-    prod_id = Column(Integer, ForeignKey("product.id"))
-    ord_date = Column(DateTime)
-    org_id = Column(Integer, ForeignKey("organization.id"))
+    prod_id = Column(Integer, ForeignKey("product.id"), index=True)
+    ord_date = Column(DateTime, index=True)
+    org_id = Column(Integer, ForeignKey("organization.id"), index=True)
     ord_price = Column(Numeric)
-    user_id = Column(Integer,ForeignKey("user.id"))
+    user_id = Column(Integer,ForeignKey("user.id"), index=True)
+    total_orders = Column(Integer)  # units across all line items
 
     user_relation = relationship("User",back_populates="order_relation")
     organization_relation = relationship("Organization",back_populates="order_relation")
     product_relation = relationship("Product",back_populates="order_relation")
+    item_relation = relationship("OrderItem",back_populates="order_relation")
+
+
+class OrderItem(Base):
+    __tablename__ = "order_items"
+
+    id = Column(Integer,primary_key=True)
+    ord_id = Column(Integer, ForeignKey("order.id", ondelete="CASCADE"), index=True)
+    prod_id = Column(Integer,ForeignKey("product.id"))
+    quantity = Column(Integer)
+    unit_price = Column(Numeric)  # prod_new_price when the order was placed
+
+    order_relation = relationship("Order",back_populates="item_relation")
     
 
 class Address(Base):
     __tablename__ = "address"
 
     id = Column(Integer,primary_key=True)
-    user_id = Column(Integer, ForeignKey("user.id"))
+    user_id = Column(Integer, ForeignKey("user.id"), index=True)
     address_line1 = Column(Text)
     address_line2 = Column(Text)
     city = Column(String)
@@ -91,3 +106,21 @@ class Address(Base):
 
     user_relation = relationship("User",back_populates="address_relation")
 
+
+class Token(Base):
+    __tablename__ = "token"
+
+    id = Column(Integer,primary_key=True)
+    token_key = Column(String, unique=True)  # sha256 hex of the API key, never the key itself
+    validity = Column(DateTime)  # UTC expiry; NULL never expires
+    org_id = Column(Integer,ForeignKey("organization.id"), index=True)
+    is_active = Column(Boolean, default = True)
+
+    organization_relation = relationship("Organization",back_populates="token_relation")
+
+
+class TableVersion(Base):
+    __tablename__ = "table_version"
+
+    table_name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,54 @@
+import base64
+import json
+from typing import Generic, List, TypeVar
+from fastapi import HTTPException, Query
+from pydantic import BaseModel
+from config import settings
+
+T = TypeVar("T")
+
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: str | None = None
+
+
+def encode_cursor(last_id: int):
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str | None):
+    if cursor is None:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last_id = json.loads(raw)["id"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return last_id
+
+
+class PageParams():
+    def __init__(
+        self,
+        after: str | None = None,
+        limit: int = Query(settings.page_size, ge=1, le=settings.max_page_size),
+    ):
+        self.after = decode_cursor(after)
+        self.limit = limit
+
+
+def keyset_page(query, column, after: int | None, limit: int):
+    # WHERE id > :after ORDER BY id LIMIT :limit + 1 -- the extra row only
+    # tells us whether another page exists, so no COUNT or OFFSET is needed.
+    if after is not None:
+        query = query.filter(column > after)
+    rows = query.order_by(column).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return rows, next_cursor
@@ -0,0 +1,79 @@
+import contextvars
+import logging
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("query_stats", default=None)
+
+
+class QueryStats():
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+# Registered on the Engine class so every engine is covered, including the
+# sync_engine behind an AsyncEngine. The stats object travels in a context
+# variable, which run_in_threadpool and run_sync both carry along. The start
+# time sits on the per-statement execution context, so a statement that
+# raises leaves nothing behind on the connection.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._qs_start = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = context._qs_start
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += time.perf_counter() - start
+
+
+def query_budget(limit: int):
+    # per-endpoint override of QUERY_BUDGET
+    def decorator(endpoint):
+        endpoint.query_budget = limit
+        return endpoint
+    return decorator
+
+
+class QueryStatsMiddleware():
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries"')
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            self._check_budget(scope, stats)
+
+    def _check_budget(self, scope, stats):
+        budget = getattr(scope.get("endpoint"), "query_budget", settings.query_budget)
+        if stats.count > budget:
+            logger.warning(
+                "%s %s ran %d queries (budget %d, %.1f ms in the database)",
+                scope["method"], scope["path"], stats.count, budget, stats.duration * 1000,
+            )
+
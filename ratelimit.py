@@ -0,0 +1,194 @@
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from starlette.datastructures import Headers
+from api_keys import api_key_index
+from config import settings
+from token_cache import token_cache
+
+# Atomic token bucket for the shared store: KEYS[1] holds {tokens, ts}.
+# Returns 0 when the request may proceed, else milliseconds to wait.
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = math.ceil((cost - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return wait
+"""
+
+
+class MemoryStore():
+    # Buckets for this worker only. Every access happens on the event loop,
+    # so no lock is needed; the oldest idle buckets are dropped past maxsize.
+    def __init__(self, rate: float, burst: float, maxsize: int):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+
+    async def take(self, key: str, cost: float):
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return 0.0
+        return (cost - bucket[0]) / self.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class RedisStore():
+    # One bucket per key across all workers, at the price of a round trip.
+    def __init__(self, url: str, rate: float, burst: float):
+        try:
+            from redis import asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_URL is set but the redis package is not installed")
+        self.rate = rate
+        self.burst = burst
+        self._redis = aioredis.from_url(url)
+        self._take = self._redis.register_script(TAKE_SCRIPT)
+
+    async def take(self, key: str, cost: float):
+        wait_ms = await self._take(keys=[f"ratelimit:{key}"], args=[self.rate, self.burst, cost, time.time()])
+        return int(wait_ms) / 1000
+
+    def __len__(self):
+        return 0
+
+
+def make_store():
+    if settings.rate_limit_url:
+        return RedisStore(settings.rate_limit_url, settings.rate_limit_rate, settings.rate_limit_burst)
+    return MemoryStore(settings.rate_limit_rate, settings.rate_limit_burst, settings.rate_limit_max_keys)
+
+
+def _digest(value: str):
+    return hashlib.blake2b(value.encode(), digest_size=12).hexdigest()
+
+
+def _ip_key(scope):
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+def client_key(scope):
+    # Identifies the caller by whatever credential it presents, verified or
+    # not. Bearer tokens and API keys are hashed, never stored.
+    headers = Headers(scope=scope)
+    authorization = headers.get("authorization")
+    if authorization and authorization[:7].lower() == "bearer ":
+        return "bearer:" + _digest(authorization[7:])
+    api_key = headers.get("x-api-key")
+    if api_key:
+        return "key:" + _digest(api_key)
+    return _ip_key(scope)
+
+
+def verified_client_key(scope):
+    # A credential only earns its own bucket once it is known to be valid:
+    # a bearer token already in the token cache, or a live API key. Anything
+    # else is charged to the IP, so made-up credentials cannot mint fresh
+    # buckets or push real ones out of the store.
+    headers = Headers(scope=scope)
+    authorization = headers.get("authorization")
+    if authorization and authorization[:7].lower() == "bearer ":
+        token = authorization[7:]
+        if token_cache.contains(token):
+            return "bearer:" + _digest(token)
+        return _ip_key(scope)
+    api_key = headers.get("x-api-key")
+    if api_key and api_key_index.contains(api_key):
+        return "key:" + _digest(api_key)
+    return _ip_key(scope)
+
+
+class RateLimiter():
+    def __init__(self, store, costs: dict[str, float], exempt_prefixes: tuple[str, ...] = ("/static", "/metrics")):
+        self.store = store
+        self.exempt_prefixes = exempt_prefixes
+        # entries ending in "/" cover everything below them, others are exact
+        self.exact_costs = {p: c for p, c in costs.items() if not p.endswith("/")}
+        self.prefix_costs = sorted(((p, c) for p, c in costs.items() if p.endswith("/")), key=lambda pc: -len(pc[0]))
+        self.limited = 0
+
+    def configured_cost(self, path: str):
+        cost = self.exact_costs.get(path)
+        if cost is None:
+            cost = next((c for p, c in self.prefix_costs if path.startswith(p)), None)
+        return cost
+
+    def cost(self, path: str):
+        cost = self.configured_cost(path)
+        # a cost above the burst could never be paid
+        return min(1 if cost is None else cost, self.store.burst)
+
+    def key(self, scope):
+        # costed routes (login, signup) are always charged to the IP, whatever
+        # credential comes along with the request
+        if self.configured_cost(scope["path"]) is not None:
+            return _ip_key(scope)
+        return verified_client_key(scope)
+
+    async def check(self, scope):
+        # seconds the client has to wait, 0 when the request may go ahead
+        if scope["path"].startswith(self.exempt_prefixes):
+            return 0
+        wait = await self.store.take(self.key(scope), self.cost(scope["path"]))
+        if wait > 0:
+            self.limited += 1
+        return wait
+
+    def stats(self):
+        return {"rate": self.store.rate, "burst": self.store.burst, "buckets": len(self.store), "limited": self.limited}
+
+
+rate_limiter = RateLimiter(make_store(), settings.rate_limit_costs)
+
+
+class RateLimitMiddleware():
+    def __init__(self, app, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        wait = await self.limiter.check(scope)
+        if wait <= 0:
+            await self.app(scope, receive, send)
+            return
+        body = b'{"detail":"Too many requests"}'
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(wait))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
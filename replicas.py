@@ -0,0 +1,136 @@
+import asyncio
+import itertools
+import logging
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from config import settings
+from database import AsyncSessionLocal, SessionLocal, engines, make_async_engine, make_engine
+
+logger = logging.getLogger(__name__)
+
+# Seconds of replay lag. A standby that has replayed everything it received
+# reports 0 even when the primary has been idle for a while; a server that
+# is not in recovery (a plain second instance) is treated as current.
+LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica():
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = make_engine(url)
+        self.session_factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=self.engine)
+        self.async_engine = None
+        self.async_session_factory = None
+        if settings.db_async:
+            self.async_engine = make_async_engine("postgresql+asyncpg://" + url.split("://", 1)[1])
+            self.async_session_factory = async_sessionmaker(self.async_engine, autoflush=False, expire_on_commit=False)
+        # None until the first successful check, and again whenever one fails
+        self.lag = None
+        self.picked = 0
+
+    @property
+    def serving_engine(self):
+        return self.async_engine or self.engine
+
+    def check_lag(self):
+        try:
+            with self.engine.connect() as conn:
+                self.lag = float(conn.scalar(LAG_SQL))
+        except Exception:
+            if self.lag is not None:
+                logger.warning("replica %s is unreachable, reads fall back to the primary", self.name, exc_info=True)
+            self.lag = None
+
+
+class ReplicaRouter():
+    def __init__(self, urls: list[str], strategy: str, max_lag: float):
+        self.replicas = [Replica(f"replica_{i}", url) for i, url in enumerate(urls)]
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.fallbacks = 0
+        self._turn = itertools.count()
+        self._monitor = None
+
+    def available(self):
+        return [r for r in self.replicas if r.lag is not None and r.lag <= self.max_lag]
+
+    def pick(self):
+        candidates = self.available()
+        if not candidates:
+            if self.replicas:
+                self.fallbacks += 1
+            return None
+        if self.strategy == "least_connections":
+            replica = min(candidates, key=lambda r: r.serving_engine.pool.checkedout())
+        else:
+            replica = candidates[next(self._turn) % len(candidates)]
+        replica.picked += 1
+        return replica
+
+    def check_lag(self):
+        for replica in self.replicas:
+            replica.check_lag()
+
+    async def monitor(self):
+        while True:
+            await asyncio.sleep(settings.replica_check_interval)
+            await run_in_threadpool(self.check_lag)
+
+    async def start(self):
+        if self.replicas:
+            await run_in_threadpool(self.check_lag)
+            self._monitor = asyncio.create_task(self.monitor())
+
+    async def stop(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+        for replica in self.replicas:
+            if replica.async_engine is not None:
+                await replica.async_engine.dispose()
+
+    def stats(self):
+        return {
+            "strategy": self.strategy,
+            "max_lag": self.max_lag,
+            "fallbacks": self.fallbacks,
+            "replicas": [
+                {
+                    "name": r.name,
+                    "lag": r.lag,
+                    "available": r in self.available(),
+                    "picked": r.picked,
+                    "checked_out": r.serving_engine.pool.checkedout(),
+                }
+                for r in self.replicas
+            ],
+        }
+
+
+router = ReplicaRouter(settings.replica_urls, settings.replica_strategy, settings.replica_max_lag)
+for replica in router.replicas:
+    engines[replica.name] = replica.engine
+    if replica.async_engine is not None:
+        engines[replica.name + "_async"] = replica.async_engine
+
+
+def get_sync_read_db():
+    replica = router.pick()
+    db = replica.session_factory() if replica else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_read_db():
+    replica = router.pick()
+    async with (replica.async_session_factory() if replica else AsyncSessionLocal()) as db:
+        yield db
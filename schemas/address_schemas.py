@@ -16,6 +16,9 @@ class AddressCreate(AddressBase):
 class AddressUpdate(AddressBase):
     pass
 
+class AddressBulkUpdate(AddressUpdate):
+    id: int
+
 class AddressRead(AddressBase):
     id: int
 
@@ -0,0 +1,15 @@
+from typing import Generic, List, TypeVar
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class BulkItemResult(BaseModel):
+    id: int
+    status: str
+
+
+class BatchRead(BaseModel, Generic[T]):
+    # found rows in the order their ids were requested
+    items: List[T]
+    missing: List[int]
@@ -1,10 +1,13 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional
 from datetime import datetime
+from schemas.product_schemas import ProductRead
+from schemas.user_schemas import UserRead
+from schemas.organization_schemas import OrgRead
 
 class OrderBase(BaseModel):
 	prod_id: int
-	org_date: datetime
+	ord_date: datetime
 	org_id: int
 	ord_price: float
 	user_id: int
@@ -15,8 +18,46 @@ class OrderCreate(OrderBase):
 class OrderUpdate(OrderBase):
 	pass
 
+class OrderBulkUpdate(OrderUpdate):
+	id: int
+
 class OrderRead(OrderBase):
 	id: int
+	# checkout orders have no single product
+	prod_id: Optional[int] = None
+	# null once the user or organization is deleted
+	org_id: Optional[int] = None
+	user_id: Optional[int] = None
+	total_orders: Optional[int] = None
 	
 	class Config:
-		from_attributes = True
\ No newline at end of file
+		from_attributes = True
+
+class OrderItemCreate(BaseModel):
+	prod_id: int
+	quantity: int = Field(1, gt=0)
+
+class OrderItemRead(OrderItemCreate):
+	id: int
+	ord_id: int
+	unit_price: float
+
+	class Config:
+		from_attributes = True
+
+class CheckoutCreate(BaseModel):
+	org_id: int
+	user_id: int
+	# defaults to now (UTC)
+	ord_date: Optional[datetime] = None
+	items: List[OrderItemCreate]
+
+class CheckoutRead(OrderRead):
+	items: List[OrderItemRead]
+
+class OrderExpanded(OrderRead):
+	# filled only for the relations named in ?expand=, omitted otherwise
+	product: Optional[ProductRead] = None
+	user: Optional[UserRead] = None
+	organization: Optional[OrgRead] = None
+	items: Optional[List[OrderItemRead]] = None
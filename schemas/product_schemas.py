@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 
 class ProductBase(BaseModel):
     prod_name: str
@@ -7,7 +7,8 @@ class ProductBase(BaseModel):
     prod_new_price: float
     prod_desc: str
     prod_image: List[str]
-    prod_thumb_img: List[str]
+    # replaced in the background by thumbnails rendered from prod_image
+    prod_thumb_img: Optional[List[str]] = None
 
 class ProductCreate(ProductBase):
     pass
@@ -15,6 +16,9 @@ class ProductCreate(ProductBase):
 class ProductUpdate(ProductBase):
     pass
 
+class ProductBulkUpdate(ProductUpdate):
+    id: int
+
 class ProductRead(ProductBase):
     id: int
 
@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class TokenCreate(BaseModel):
+    # UTC; leave out for a key that never expires
+    validity: Optional[datetime] = None
+
+class TokenRead(BaseModel):
+    id: int
+    org_id: int
+    validity: Optional[datetime] = None
+    is_active: bool
+
+    class Config:
+        from_attributes = True
+
+class TokenIssued(TokenRead):
+    # only ever returned once, when the token is created
+    key: str
@@ -0,0 +1,22 @@
+from functools import lru_cache
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def type_adapter(tp):
+    return TypeAdapter(tp)
+
+
+def dump_json(tp, data, exclude_unset: bool = False):
+    # validate straight from ORM attributes and let pydantic-core write the
+    # bytes, skipping FastAPI's dump_python + jsonable_encoder round trip
+    adapter = type_adapter(tp)
+    return adapter.dump_json(adapter.validate_python(data, from_attributes=True), exclude_unset=exclude_unset)
+
+
+def json_response(tp, data, status_code: int = 200, headers: dict | None = None, exclude_unset: bool = False):
+    return Response(
+        dump_json(tp, data, exclude_unset),
+        status_code=status_code, headers=headers, media_type="application/json",
+    )
@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import settings
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it thumbnails are left as sent
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = "static"
+STATIC_URL = "/static/"
+THUMBS_DIR = "thumbs"
+
+
+def source_path(image_url: str):
+    # Only images we serve ourselves can be thumbnailed; remote URLs and
+    # paths escaping the static directory are skipped.
+    if not image_url.startswith(STATIC_URL):
+        return None
+    root = os.path.realpath(STATIC_DIR)
+    path = os.path.realpath(os.path.join(root, image_url[len(STATIC_URL):]))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    return path
+
+
+def render_thumbnail(path: str, size: int, quality: int):
+    # Runs in a worker process. The output name hashes the source bytes and
+    # the settings, so an unchanged image is never decoded twice and the
+    # name qualifies for immutable caching.
+    with open(path, "rb") as file:
+        source = file.read()
+    digest = hashlib.sha256(source + f":{size}:{quality}".encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = f"{stem}.{digest}.webp"
+    target = os.path.join(STATIC_DIR, THUMBS_DIR, name)
+    if not os.path.exists(target):
+        with Image.open(io.BytesIO(source)) as image:
+            image.thumbnail((size, size))
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+            out = io.BytesIO()
+            image.save(out, "WEBP", quality=quality)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as file:
+            file.write(out.getvalue())
+        os.replace(tmp, target)
+    return f"{STATIC_URL}{THUMBS_DIR}/{name}"
+
+
+class ThumbnailPool():
+    def __init__(self, workers: int, size: int, quality: int):
+        self.workers = workers
+        self.size = size
+        self.quality = quality
+        self.rendered = 0
+        self.failed = 0
+        self._executor = None
+
+    @property
+    def enabled(self):
+        return Image is not None and self.workers > 0
+
+    def executor(self):
+        # created on first use; spawn keeps the children from inheriting the
+        # parent's event loop, threads and database connections
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _discard(self, executor):
+        # a worker that died (OOM, segfault in a decoder) breaks the whole
+        # pool for good; the next render starts a fresh one
+        if self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _render_one(self, executor, path: str | None):
+        if path is None:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, render_thumbnail, path, self.size, self.quality,
+        )
+
+    async def render(self, image_urls: list[str]):
+        # Returns one entry per image URL, in order: the thumbnail URL, or
+        # None where the image is not local or could not be decoded.
+        executor = self.executor()
+        paths = [source_path(url) for url in image_urls]
+        results = await asyncio.gather(
+            *(self._render_one(executor, path) for path in paths), return_exceptions=True,
+        )
+        thumbs = []
+        for path, result in zip(paths, results):
+            if isinstance(result, Exception):
+                self.failed += 1
+                logger.warning("thumbnail for %s failed: %r", path, result)
+                if isinstance(result, BrokenProcessPool):
+                    self._discard(executor)
+                thumbs.append(None)
+            else:
+                if result is not None:
+                    self.rendered += 1
+                thumbs.append(result)
+        return thumbs
+
+    def stats(self):
+        return {"enabled": self.enabled, "workers": self.workers, "rendered": self.rendered, "failed": self.failed}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+thumbnail_pool = ThumbnailPool(settings.thumbnail_workers, settings.thumbnail_size, settings.thumbnail_quality)
@@ -0,0 +1,83 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from config import settings
+
+
+class TokenCache():
+    # Keyed by a digest of the bearer token so raw tokens never sit in memory.
+    # Entries live until the token's exp claim or the TTL, whichever comes
+    # first, or until the user changes in this worker.
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._by_user = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user
+
+    def contains(self, token: str):
+        # A check that leaves the hit counters and LRU order alone.
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.time()
+
+    def set(self, token: str, expires_at: float | None, user):
+        # expires_at is None for a token without an exp claim: TTL only
+        key = self._key(token)
+        expires_at = time.time() + self.ttl if expires_at is None else min(expires_at, time.time() + self.ttl)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (expires_at, user)
+            self._by_user.setdefault(user.id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in self._by_user.pop(user_id, ()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def stats(self):
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_user.get(entry[1].id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[entry[1].id]
+
+
+token_cache = TokenCache(settings.token_cache_size, settings.token_cache_ttl)